@@ -0,0 +1,140 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+REPORT_FILE = os.path.join(os.path.expanduser("~"), ".cache", "pi-stomp", "boot.json")
+# Number of previous boots whose totals are kept in the report, for spotting regressions
+HISTORY_SIZE = 20
+
+
+def process_times():
+    # (seconds since this process started, system uptime when it started), (None, None) if not available
+    try:
+        with open("/proc/uptime", 'r') as f:
+            uptime = float(f.read().split()[0])
+        with open("/proc/self/stat", 'r') as f:
+            # Fields after the command name (which may contain spaces), starttime is field 22
+            fields = f.read().rsplit(')', 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return uptime - started, started
+    except (OSError, ValueError, IndexError):
+        return None, None
+
+
+class BootProfiler:
+
+    # Records the wall time of each startup phase and of loading each pedalboard, and writes them as json to
+    # report_file (replaced every boot, along with the totals of the previous boots)
+
+    def __init__(self, report_file=REPORT_FILE):
+        self.report_file = report_file
+        self.start = time.monotonic()
+        self.process_age, self.process_start_uptime = process_times()
+        self.phases = []
+        self.pedalboards = {}    # {title: {source, parse, populate, ...}}
+        self.init_time = None    # startup to ready for input
+        self.background_time = None
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # saved from the main and background threads
+        self.history = self.load_history()
+
+    def load_history(self):
+        try:
+            with open(self.report_file, 'r') as f:
+                j = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if not isinstance(j, dict):
+            return []
+        history = j.get('history', [])
+        if j.get('init') is not None:
+            history.append({'time': j.get('time'), 'init': j.get('init'), 'background': j.get('background')})
+        return history[-HISTORY_SIZE:]
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - start
+            with self.lock:
+                self.phases.append({'name': name, 'start': round(start - self.start, 4), 'seconds': round(seconds, 4)})
+            logging.info("Startup: %s took %.3fs" % (name, seconds))
+
+    def pedalboard(self, title, source, **timings):
+        # source is "cache" or "parsed", timings are seconds (parse, populate, ...)
+        entry = {'source': source}
+        for k, v in timings.items():
+            entry[k] = round(v, 4)
+        with self.lock:
+            self.pedalboards[title] = entry
+
+    def done(self):
+        # Ready for input
+        self.init_time = time.monotonic() - self.start
+        logging.info("Startup: ready after %.3fs" % self.init_time)
+        self.save()
+
+    def background_done(self):
+        # Background work (eg. parsing the pedalboards not in the cache) finished
+        self.background_time = time.monotonic() - self.start
+        self.save()
+
+    def report(self):
+        with self.lock:
+            return {
+                'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'process_age': round(self.process_age, 4) if self.process_age is not None else None,
+                'process_start_uptime': self.process_start_uptime,
+                'init': round(self.init_time, 4) if self.init_time is not None else None,
+                'background': round(self.background_time, 4) if self.background_time is not None else None,
+                'phases': list(self.phases),
+                'pedalboards': dict(self.pedalboards),
+                'history': self.history
+            }
+
+    def save(self):
+        report = self.report()
+        with self.save_lock:
+            try:
+                os.makedirs(os.path.dirname(self.report_file), exist_ok=True)
+                tmp_file = self.report_file + ".tmp"
+                with open(tmp_file, 'w') as f:
+                    json.dump(report, f, indent=2)
+                os.replace(tmp_file, self.report_file)
+            except OSError as e:
+                logging.error("Failed to write startup report %s: %s" % (self.report_file, e))
+
+    def log_summary(self):
+        report = self.report()
+        if report['process_age'] is not None:
+            logging.info("Startup: %.3fs from process start to profiling (system up %.1fs at process start)" %
+                         (report['process_age'], report['process_start_uptime']))
+        for p in report['phases']:
+            logging.info("Startup: %-24s %8.3fs" % (p['name'], p['seconds']))
+        slowest = sorted(report['pedalboards'].items(), key=lambda i: -sum(v for k, v in i[1].items()
+                                                                              if k != 'source'))
+        for title, entry in slowest[:5]:
+            logging.info("Startup: pedalboard %s %s" % (title, entry))
+        logging.info("Startup: ready %ss, background done %ss, report in %s" %
+                     (report['init'], report['background'], self.report_file))
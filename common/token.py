@@ -16,6 +16,7 @@
 ACTION = 'action'
 ADC_INPUT = 'adc_input'
 ANALOG_CONTROLLERS = 'analog_controllers'
+BINDING = 'binding'
 BUNDLE = 'bundle'
 BYPASS = 'bypass'
 CATEGORY = 'category'
@@ -32,7 +33,9 @@ GPIO_INPUT = 'gpio_input'
 GPIO_OUTPUT = 'gpio_output'
 HARDWARE = 'hardware'
 ID = 'id'
+IDLE_TIMEOUT = 'idle_timeout'
 INPUT = 'input'
+INSTANCE_ID = 'instance_id'
 KNOB = 'KNOB'
 LEFT = 'LEFT'
 LEFT_RIGHT = 'LEFT_RIGHT'
@@ -43,6 +46,8 @@ MINIMUM = 'minimum'
 NAME = 'name'
 NONE = 'None'
 PARAMETER = 'parameter'
+PARAMETERS = 'parameters'
+PLUGINS = 'plugins'
 PORTS = 'ports'
 PRESET = 'preset'
 RANGES = 'ranges'
@@ -53,4 +58,5 @@ THRESHOLD = 'threshold'
 TITLE = 'title'
 TYPE = 'type'
 UP = 'UP'
+VALUE = 'value'
 VERSION = 'version'
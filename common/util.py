@@ -13,6 +13,8 @@
 # You should have received a copy of the GNU General Public License
 # along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
 
+import os
+
 
 def LILV_FOREACH(collection, func):
     itr = collection.begin()
@@ -57,3 +59,12 @@ def format_float(value):
             return "%.1f" % value
     else:
         return "%d" % value
+
+
+def resident_memory():
+    # Resident set size of this process in bytes (0 if not available)
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
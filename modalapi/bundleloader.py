@@ -0,0 +1,146 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import lilv
+import logging
+import os
+import threading
+
+import common.token as Token
+import common.util as util
+
+# One lilv World per process, shared by all pedalboards (see shared_loader())
+_loader = None
+
+
+def shared_loader():
+    global _loader
+    if _loader is None:
+        _loader = BundleLoader()
+    return _loader
+
+
+class BundleLoader:
+
+    # Parses pedalboard bundles with a single lilv World.  Specifications and plugin classes are loaded once,
+    # each bundle is loaded, extracted into plain python data (no lilv nodes), then unloaded again so the
+    # World doesn't keep growing with every pedalboard.
+
+    def __init__(self):
+        self.lock = threading.Lock()  # the world isn't thread safe
+        self.world = lilv.World()
+
+        # this is needed when loading specific bundles instead of load_all
+        # (these functions are not exposed via World yet)
+        self.world.load_specifications()
+        self.world.load_plugin_classes()
+
+        self.uri_arc   = self.world.new_uri("http://drobilla.net/ns/ingen#arc")
+        self.uri_block = self.world.new_uri("http://drobilla.net/ns/ingen#block")
+        self.uri_head  = self.world.new_uri("http://drobilla.net/ns/ingen#head")
+        self.uri_port  = self.world.new_uri("http://lv2plug.in/ns/lv2core#port")
+        self.uri_tail  = self.world.new_uri("http://drobilla.net/ns/ingen#tail")
+        self.uri_value = self.world.new_uri("http://drobilla.net/ns/ingen#value")
+        self.uri_type  = self.world.new_uri("http://www.w3.org/1999/02/22-rdf-syntax-ns#type")
+
+    def get_pedalboard_plugin(self, bundlenode):
+        # get the plugin which came from this bundle (the pedalboard)
+        plugins = [p for p in self.world.get_all_plugins() if str(p.get_bundle_uri()) == str(bundlenode)]
+
+        # make sure the bundle includes 1 and only 1 plugin (the pedalboard)
+        if len(plugins) != 1:
+            raise Exception('get_pedalboard_plugin(%s) - bundle has 0 or > 1 plugin' % str(bundlenode))
+        return plugins[0]
+
+    def load(self, bundlepath):
+        # lilv wants the last character as the separator
+        bundle = os.path.abspath(bundlepath)
+        if not bundle.endswith(os.sep):
+            bundle += os.sep
+        with self.lock:
+            # convert bundle string into a lilv node
+            bundlenode = self.world.new_file_uri(None, bundle)
+
+            self.world.load_bundle(bundlenode)
+            try:
+                return self.extract(bundlepath, self.get_pedalboard_plugin(bundlenode))
+            finally:
+                # Drop the bundle's statements from the world, only the extracted data is kept
+                self.world.unload_bundle(bundlenode)
+
+    # Extract the pedalboard info into plain python objects:
+    # {'blocks': [{'instance_id', 'plugin_uri', 'ports': [{symbol, value, binding}]}],
+    #  'arcs': [[tail_instance_id, head_instance_id], ...]}   (None for a pedalboard (system) port)
+    def extract(self, bundlepath, plugin):
+        # check if the plugin is a pedalboard
+        def fill_in_type(node):
+            if node is not None and node.is_uri():
+                return node
+            return None
+
+        plugin_types = [i for i in util.LILV_FOREACH(plugin.get_value(self.uri_type), fill_in_type)]
+        if "http://moddevices.com/ns/modpedal#Pedalboard" not in plugin_types:
+            raise Exception('get_pedalboard_info(%s) - plugin has no mod:Pedalboard type' % bundlepath)
+
+        def instance_id(block):
+            return str(block.get_path()).replace(bundlepath, "", 1)
+
+        # Iterate blocks (plugins)
+        blocks = []
+        port_owner = {}  # port uri: instance_id of the block it belongs to
+        for block in plugin.get_value(self.uri_block):
+            if block is None or block.is_blank():
+                continue
+            block_id = instance_id(block)
+
+            plugin_uri = None
+            prototype = self.world.find_nodes(block, self.world.ns.lv2.prototype, None)
+            if len(prototype) > 0:
+                plugin_uri = str(prototype[0])
+
+            # Extract port data
+            ports = []
+            for port in self.world.find_nodes(block, self.world.ns.lv2.port, None):
+                port_owner[str(port)] = block_id
+                param_value = self.world.get(port, self.uri_value, None)
+                binding = self.world.get(port, self.world.ns.midi.binding, None)
+                if binding is not None:
+                    controller_num = self.world.get(binding, self.world.ns.midi.controllerNumber, None)
+                    channel = self.world.get(binding, self.world.ns.midi.channel, None)
+                    if (controller_num is not None) and (channel is not None):
+                        binding = "%d:%d" % (self.world.new_int(channel), self.world.new_int(controller_num))
+                        logging.debug("  MIDI CC binding %s" % binding)
+                    else:
+                        binding = str(binding)
+                value = None
+                if param_value is not None:
+                    if param_value.is_float():
+                        value = float(self.world.new_float(param_value))
+                    elif param_value.is_int():
+                        value = int(self.world.new_int(param_value))
+                ports.append({Token.SYMBOL: os.path.basename(str(port)), Token.VALUE: value, Token.BINDING: binding})
+
+            blocks.append({Token.INSTANCE_ID: block_id, 'plugin_uri': plugin_uri, Token.PORTS: ports})
+
+        # Connections, as pairs of the blocks owning the tail and head ports
+        arcs = []
+        for arc in plugin.get_value(self.uri_arc):
+            tail = self.world.get(arc, self.uri_tail, None)
+            head = self.world.get(arc, self.uri_head, None)
+            if tail is None or head is None:
+                continue
+            arcs.append([port_owner.get(str(tail)), port_owner.get(str(head))])
+
+        return {'blocks': blocks, 'arcs': arcs}
@@ -0,0 +1,81 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import queue
+import threading
+
+
+class CommandQueue:
+
+    # Runs (mod-ui) requests on a worker thread so the main loop, which polls the hardware, never waits on them.
+    # Commands run one at a time in the order submitted.  When a command finishes, its callback is called with
+    # the command's return value from poll(), ie. on the main thread, so callbacks are free to update the LCD
+    # and handler state.
+
+    def __init__(self, name="mod-ui-commands"):
+        self.name = name
+        self.requests = queue.Queue()
+        self.completions = queue.Queue()
+        self.pending = 0  # submitted but not yet completed (by poll), only touched by the main thread
+        self.thread = None
+        self.wakeup = None  # if set, called (from the worker thread) when a command completes
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def submit(self, func, args=(), callback=None):
+        self.pending += 1
+        self.requests.put((func, args, callback))
+
+    def busy(self):
+        return self.pending > 0
+
+    def run(self):
+        while True:
+            command = self.requests.get()
+            if command is None:
+                break
+            func, args, callback = command
+            try:
+                result = func(*args)
+            except Exception as e:
+                logging.error("Command %s failed: %s" % (func.__name__, e))
+                result = None
+            self.completions.put((callback, result))
+            if self.wakeup is not None:
+                self.wakeup()
+
+    def poll(self):
+        # Call the callbacks of completed commands.  Must be called from the main thread
+        while True:
+            try:
+                callback, result = self.completions.get_nowait()
+            except queue.Empty:
+                return
+            self.pending -= 1
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception as e:
+                    logging.error("Command callback %s failed: %s" % (callback.__name__, e))
+
+    def stop(self, timeout=None):
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join(timeout)
+            self.thread = None
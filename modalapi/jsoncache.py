@@ -0,0 +1,66 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+
+import common.util as util
+
+
+class JsonCache:
+
+    # Versioned dictionary of entries persisted as a json file.  Subclasses decide what an entry holds and
+    # when it's still valid.  A file with a different version is discarded (rebuilt from scratch)
+
+    def __init__(self, cache_file, version):
+        self.cache_file = cache_file
+        self.version = version
+        self.entries = {}
+        self.dirty = False
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                j = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable cache %s: %s" % (self.cache_file, e))
+            return
+        if util.DICT_GET(j, 'version') != self.version:
+            logging.info("Cache version changed, rebuilding %s" % self.cache_file)
+            self.dirty = True
+            return
+        self.entries = util.DICT_GET(j, 'entries') or {}
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump({'version': self.version, 'entries': self.entries}, f)
+            os.replace(tmp_file, self.cache_file)  # atomic, a crash mid-write never leaves a corrupt cache
+            self.dirty = False
+        except OSError as e:
+            logging.error("Failed to write cache %s: %s" % (self.cache_file, e))
+
+    def prune(self, keys):
+        # Drop entries whose key is not in keys
+        for key in [k for k in self.entries if k not in keys]:
+            del self.entries[key]
+            self.dirty = True
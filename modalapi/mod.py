@@ -17,17 +17,27 @@ import json
 import logging
 import os
 import requests as req
-import subprocess
 import sys
+import threading
 import time
 import yaml
 
+from concurrent.futures import ThreadPoolExecutor
+
 import common.token as Token
 import common.util as util
 import pistomp.analogswitch as AnalogSwitch
 import pistomp.encoderswitch as EncoderSwitch
+import modalapi.commandqueue as CommandQueue
+import modalapi.modclient as ModClient
+import modalapi.modwebsocket as ModWebSocket
 import modalapi.pedalboard as Pedalboard
+import modalapi.pedalboardcache as PedalboardCache
+import modalapi.pedalboardloader as PedalboardLoader
 import modalapi.parameter as Parameter
+import modalapi.parametercoalescer as ParameterCoalescer
+import modalapi.plugincache as PluginCache
+import modalapi.systeminfo as SystemInfo
 
 from pistomp.analogmidicontrol import AnalogMidiControl
 from pistomp.footswitch import Footswitch
@@ -38,6 +48,15 @@ from pathlib import Path
 #sys.path.append('/usr/lib/python3.5/site-packages')  # TODO possibly /usr/local/modep/mod-ui
 #from mod.development import FakeHost as Host
 
+# Seconds between checks for changes made via the MOD UI (full rate, idle)
+MODUI_POLL_INTERVAL = 1.0
+MODUI_IDLE_INTERVAL = 5.0
+# Seconds between LCD footswitch redraws (full rate, idle)
+LCD_INTERVAL = 0.04
+LCD_IDLE_INTERVAL = 0.2
+# Seconds after a pedalboard is parsed on demand before the caches are saved (so a run of changes saves once)
+CACHE_SAVE_DELAY = 10.0
+
 class TopEncoderMode(Enum):
     DEFAULT = 0
     PRESET_SELECT = 1
@@ -89,6 +108,21 @@ class Mod(Handler):
         self.lcd = None
         self.homedir = homedir
         self.root_uri = "http://localhost:80/"
+        self.client = ModClient.ModClient(self.root_uri)
+        self.bulk_get_supported = True  # False once mod-ui is found not to have the pi_stomp_get_all endpoint
+        self.bulk_set_supported = True  # likewise for pi_stomp_set_all
+
+        # Requests which can take a while (loading a pedalboard/preset, changing parameters) are run in the
+        # background so hardware polling continues while mod-ui is busy
+        self.commands = CommandQueue.CommandQueue()
+        self.commands.start()
+
+        # Parameter values from value edits are coalesced so spinning an encoder doesn't flood mod-ui
+        self.parameter_commits = ParameterCoalescer.ParameterCoalescer(self.parameter_commits_send)
+        self.parameter_commits_timer = None  # reactor timer sending values held back by the rate limit
+
+        # Changes made via MOD UI are pushed to us over its websocket (when available)
+        self.modui_events = ModWebSocket.ModWebSocket("ws://localhost:80/websocket")
 
         self.pedalboards = {}
         self.pedalboard_list = []  # TODO LAME to have two lists
@@ -101,16 +135,35 @@ class Mod(Handler):
         self.parameter_tweak_amount = 8
 
         self.plugin_dict = {}
+        self.plugin_port_index = {}  # {plugin_uri: {symbol: port_info}} built from plugin_dict as plugins are used
+
+        # Parsed pedalboard data is cached here so only new/modified bundles need to be parsed at boot
+        self.cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "pi-stomp")
+        self.pedalboard_cache_file = os.path.join(self.cache_dir, "pedalboards.json")
+        self.plugin_cache_file = os.path.join(self.cache_dir, "plugins.json")
+
+        # Number of processes used to parse pedalboard bundles (None means one per CPU core)
+        self.loader_workers = None
+        self.pedalboard_cache = None
+        self.plugin_cache = None
+        self.pedalboard_loader = None
+        self.pedalboard_load_lock = threading.Lock()
+        self.pedalboard_loader_thread = None
+        self.caches_dirty = False     # a pedalboard was parsed on demand since the caches were last saved
+        self.cache_save_timer = None
+        self.profiler = None  # BootProfiler recording startup timings, if any
 
         self.hardware = None
+        self.reactor = None
+        self.lcd_fs_dirty = False
+        self.lcd_bypass_dirty = False
 
         self.top_encoder_mode = TopEncoderMode.DEFAULT
         self.bot_encoder_mode = BotEncoderMode.DEFAULT
         self.universal_encoder_mode = UniversalEncoderMode.DEFAULT
 
         self.wifi_status = {}
-        self.software_version = None
-        self.git_describe = None
+        self.system_info = SystemInfo.SystemInfo(self.homedir, self.system_info_wifi_change)
 
         self.current = None  # pointer to Current class
         self.deep = None     # pointer to current Deep class
@@ -252,6 +305,9 @@ class Mod(Handler):
     def universal_encoder_sw(self, value):
         # State machine for universal rotary encoder switch
         mode = self.universal_encoder_mode
+        if mode == UniversalEncoderMode.LOADING:
+            # ignore presses when loading, the mode is restored once loading completes
+            return
         if value == EncoderSwitch.Value.RELEASED:
             if mode == UniversalEncoderMode.DEFAULT:
                 self.universal_encoder_mode = UniversalEncoderMode.SCROLL
@@ -271,14 +327,9 @@ class Mod(Handler):
                     self.universal_encoder_mode = UniversalEncoderMode.SYSTEM_MENU
                     self.system_menu_show()
             elif mode == UniversalEncoderMode.PEDALBOARD_SELECT:
-                self.universal_encoder_mode = UniversalEncoderMode.LOADING
                 self.pedalboard_change()
-                self.universal_encoder_mode = UniversalEncoderMode.DEFAULT
             elif mode == UniversalEncoderMode.PRESET_SELECT:
-                self.universal_encoder_mode = UniversalEncoderMode.LOADING
                 self.preset_change()
-                self.update_lcd_title()
-                self.universal_encoder_mode = UniversalEncoderMode.DEFAULT
             elif mode == UniversalEncoderMode.SYSTEM_MENU:
                 self.menu_action()
                 return
@@ -366,8 +417,84 @@ class Mod(Handler):
         return self.selectable_items[self.selectable_index][0]
 
     def poll_controls(self):
-        if self.universal_encoder_mode is not UniversalEncoderMode.LOADING:
-            self.hardware.poll_controls()
+        # Hardware is polled even while loading (so footswitches keep working), encoder rotation is ignored then
+        self.hardware.poll_controls()
+        self.poll_host()
+
+    def poll_host(self):
+        # Handle completed mod-ui requests and changes pushed by mod-ui
+        self.commands.poll()
+        self.poll_modui_events()
+        self.parameter_commits.poll()
+        self.system_info.poll()
+
+    def register_event_sources(self, reactor):
+        self.reactor = reactor
+        self.hardware.register_event_sources(reactor)
+        self.commands.wakeup = reactor.wakeup
+        self.modui_events.wakeup = reactor.wakeup
+        self.system_info.wakeup = reactor.wakeup
+        reactor.on_wakeup(self.poll_host)
+        scheduler = self.hardware.scheduler
+        scheduler.add("modui", self.poll_modui_changes, MODUI_POLL_INTERVAL, MODUI_IDLE_INTERVAL)
+        scheduler.add("lcd", self.lcd_refresh, LCD_INTERVAL, LCD_IDLE_INTERVAL)
+
+    def poll_modui_events(self):
+        # Apply changes pushed by MOD UI
+        for event in self.modui_events.poll():
+            if self.current is None:
+                continue
+            if event[0] == ModWebSocket.PARAM_SET:
+                self.modui_parameter_set(event[1], event[2], event[3])
+            elif event[0] == ModWebSocket.PEDAL_SNAPSHOT:
+                self.modui_preset_change(event[1])
+            elif event[0] == ModWebSocket.LOADING_END:
+                # A pedalboard was loaded.  Ignore it if we asked for it (the command callback takes care of it)
+                if not self.commands.busy():
+                    self.commands.submit(self.modui_pedalboard_request, (), self.modui_pedalboard_done)
+
+    def modui_parameter_set(self, instance_id, symbol, value):
+        plugin = None
+        for p in self.current.pedalboard.plugins:
+            if p.instance_id == instance_id:
+                plugin = p
+                break
+        if plugin is None:
+            return
+        param = plugin.parameters.get(symbol)
+        if param is None or param.value == value:
+            return
+        if self.universal_encoder_mode == UniversalEncoderMode.VALUE_EDIT or \
+                self.bot_encoder_mode == BotEncoderMode.VALUE_EDIT:
+            if self.deep is not None and param is self.deep.selected_parameter:
+                return  # Being edited here, the message is (most likely) an echo of our own change
+        self.plugin_parameter_update(plugin, param, value)
+        if symbol == ":bypass":
+            self.update_lcd_plugins()
+            self.update_lcd_fs()
+
+    def modui_preset_change(self, index):
+        if index not in self.current.presets or index == self.current.preset_index:
+            return
+        logging.info("Preset changed via MOD to: %d" % index)
+        self.current.preset_index = index
+        self.selected_preset_index = index
+        self.update_lcd_title()
+
+    def modui_pedalboard_request(self):
+        # Runs on the command thread
+        bundle = self.get_current_pedalboard_bundle_path()
+        pedalboard = self.pedalboards.get(bundle)
+        if pedalboard is None or pedalboard is self.current.pedalboard:
+            return None
+        logging.info("Pedalboard changed via MOD from: %s to: %s" % (self.current.pedalboard.bundle, bundle))
+        self.pedalboard_load(pedalboard)
+        return pedalboard, self.get_presets()
+
+    def modui_pedalboard_done(self, result):
+        if result is not None:
+            pedalboard, presets = result
+            self.set_current_pedalboard(pedalboard, presets)
 
     def poll_modui_changes(self):
         # This poll looks for changes made via the MOD UI and tries to sync the pi-Stomp hardware
@@ -378,6 +505,13 @@ class Mod(Handler):
         #
         # TODO this is an interim solution until better MOD-UI to pi-stomp event communication is added
         #
+        if self.commands.busy():
+            return  # Wait for our own requests to complete, they might be what changed it
+        if self.modui_events.connected:
+            # Changes are being pushed over the websocket, just keep the timestamp current for if it disconnects
+            if Path(self.pedalboard_modification_file).exists():
+                self.pedalboard_change_timestamp = os.path.getmtime(self.pedalboard_modification_file)
+            return
         if Path(self.pedalboard_modification_file).exists():
             ts = os.path.getmtime(self.pedalboard_modification_file)
             if ts == self.pedalboard_change_timestamp:
@@ -399,29 +533,66 @@ class Mod(Handler):
     # Pedalboard Stuff
     #
 
-    def load_pedalboards(self):
-        url = self.root_uri + "pedalboard/list"
+    def cleanup(self):
+        if self.hardware is not None:
+            self.hardware.cleanup()
+        self.parameter_commits.flush()
+        self.modui_events.stop()
+        self.system_info.stop(1)
+        self.audiocard.flush_store()
+        self.commands.stop(5)
+        if self.caches_dirty:
+            self.save_caches()
+        self.client.log_stats()
 
+    def load_pedalboards(self):
         try:
-            resp = req.get(url)
-        except:  # TODO
-            logging.error("Cannot connect to mod-host")
+            resp = self.client.get("pedalboard/list")
+        except req.RequestException as e:
+            logging.error("Cannot connect to mod-host: %s" % e)
             sys.exit()
 
         if resp.status_code != 200:
             logging.error("Cannot connect to mod-host.  Status: %s" % resp.status_code)
             sys.exit()
 
+        self.pedalboard_cache = PedalboardCache.PedalboardCache(self.pedalboard_cache_file)
+        self.pedalboard_cache.load()
+
+        # Plugin descriptors which haven't changed since last boot don't need to be requested from mod-ui
+        self.plugin_cache = PluginCache.PluginCache(self.plugin_cache_file)
+        self.plugin_cache.load()
+        self.plugin_dict.update(self.plugin_cache.get_all())
+        self.pedalboard_loader = PedalboardLoader.PedalboardLoader(self.client, self.plugin_dict,
+                                                                   self.plugin_port_index, self.loader_workers)
+
+        # Create all pedalboards right away (so their titles are available for selection), but only populate
+        # those found in the cache.  The rest get parsed by the background loader or on demand
         pbs = json.loads(resp.text)
         for pb in pbs:
-            logging.info("Loading pedalboard info: %s" % pb[Token.TITLE])
             bundle = pb[Token.BUNDLE]
             title = pb[Token.TITLE]
             pedalboard = Pedalboard.Pedalboard(title, bundle)
-            pedalboard.load_bundle(bundle, self.plugin_dict)
+            data = self.pedalboard_cache.get(bundle, self.plugin_cache.cached_signature)
+            if data is not None:
+                logging.debug("Loading pedalboard info from cache: %s" % title)
+                start = time.monotonic()
+                pedalboard.load_dict(data)
+                if self.profiler is not None:
+                    self.profiler.pedalboard(title, "cache", populate=time.monotonic() - start)
             self.pedalboards[bundle] = pedalboard
             self.pedalboard_list.append(pedalboard)
-            #logging.debug("dump: %s" % pedalboard.to_json())
+
+        # The current pedalboard is needed to start playing, so parse it now
+        current = self.pedalboards.get(self.get_current_pedalboard_bundle_path())
+        if current is not None:
+            self.pedalboard_load(current)
+
+        self.pedalboard_loader_thread = threading.Thread(target=self.load_pedalboards_background,
+                                                         name="pedalboard-loader", daemon=True)
+        self.pedalboard_loader_thread.start()
+
+        self.modui_events.start()
 
         # TODO - example of querying host
         #bund = self.get_current_pedalboard()
@@ -429,20 +600,128 @@ class Mod(Handler):
         #logging.debug("Preset: %s %d" % (bund, self.host.pedalboard_preset))  # this value not initialized
         #logging.debug("Preset: %s" % self.get_current_preset_name())
 
+    def load_pedalboards_background(self):
+        mem_start = util.resident_memory()
+        to_parse = [pb for pb in self.pedalboard_list if not pb.loaded]
+        for pedalboard in to_parse:
+            logging.info("Loading pedalboard info: %s" % pedalboard.title)
+
+        # Parse the new/modified bundles (in parallel), then cache the result
+        loaded = self.pedalboard_loader.load(to_parse, self.pedalboard_load_lock)
+        with self.pedalboard_load_lock:
+            for pedalboard in loaded:
+                self.cache_pedalboard(pedalboard)
+                #logging.debug("dump: %s" % pedalboard.to_json())
+            self.pedalboard_cache.prune(self.pedalboards)
+            self._save_caches()
+
+        if self.profiler is not None:
+            for pedalboard in loaded:
+                self.profile_pedalboard(pedalboard)
+            self.profiler.background_done()
+
+        # Those not in loaded were either parsed on demand meanwhile or failed to parse
+        num_parsed = len(loaded)
+        failed = [pb.title for pb in to_parse if not pb.loaded]
+        logging.info("Loaded %d pedalboards (%d parsed, %d from cache)" %
+                     (len(self.pedalboard_list) - len(failed), num_parsed,
+                      len(self.pedalboard_list) - len(to_parse)))
+        if len(failed) > 0:
+            logging.warning("Failed to load %d pedalboards: %s" % (len(failed), ", ".join(failed)))
+        if self.pedalboard_loader.parsed > 0:
+            # Parsing happens in worker processes, so what lilv costs is measured in those.  This process just
+            # keeps the extracted data
+            parse_mem, processes = self.pedalboard_loader.parse_memory()
+            logging.info("Pedalboard parsing memory: %d KB in %d processes, %d KB per parsed pedalboard" %
+                         (parse_mem / 1024, processes, parse_mem / 1024 / self.pedalboard_loader.parsed))
+        if num_parsed > 0:
+            mem_used = util.resident_memory() - mem_start
+            logging.info("Pedalboard data memory: %d KB, %d KB per parsed pedalboard" %
+                         (mem_used / 1024, mem_used / 1024 / num_parsed))
+
+    def pedalboard_load(self, pedalboard):
+        # Parse a pedalboard now if the background loader hasn't got to it yet
+        with self.pedalboard_load_lock:
+            if pedalboard.loaded:
+                return
+            logging.info("Loading pedalboard info: %s" % pedalboard.title)
+            if not self.pedalboard_loader.load_one(pedalboard):
+                return
+            self.cache_pedalboard(pedalboard)
+            self.caches_dirty = True
+        if self.profiler is not None:
+            self.profile_pedalboard(pedalboard)
+
+    def schedule_cache_save(self):
+        # Save the caches (on the command thread) once no pedalboard has been parsed on demand for a while.  Must
+        # be called from the main thread
+        if self.reactor is None:
+            self.commands.submit(self.save_caches)
+        elif self.cache_save_timer is None:
+            self.cache_save_timer = self.reactor.call_later(CACHE_SAVE_DELAY, self.cache_save_timer_expired)
+
+    def cache_save_timer_expired(self):
+        self.cache_save_timer = None
+        self.commands.submit(self.save_caches)
+
+    def save_caches(self):
+        with self.pedalboard_load_lock:
+            self._save_caches()
+
+    def _save_caches(self):
+        # Called with pedalboard_load_lock held
+        self.caches_dirty = False
+        self.pedalboard_cache.save()
+        self.plugin_cache.update(self.plugin_dict)
+        self.plugin_cache.save()
+
+    def cache_pedalboard(self, pedalboard):
+        # A plugin whose info couldn't be fetched (eg. effect/get timed out) was loaded without its parameters.
+        # Don't cache that, so the pedalboard gets parsed again next boot.  The signatures of the plugins used
+        # are cached with it, so it's also parsed again once one of them is upgraded
+        plugins = {}
+        missing = []
+        for uri in pedalboard.plugin_uris:
+            info = self.plugin_dict.get(uri)
+            sig = PluginCache.PluginCache.plugin_signature(info) if info is not None else None
+            if sig is None:
+                missing.append(uri)
+            else:
+                plugins[uri] = sig
+        if len(missing) > 0:
+            logging.warning("Not caching pedalboard %s, no plugin info for: %s" % (pedalboard.title,
+                                                                                  ", ".join(missing)))
+            return
+        self.pedalboard_cache.put(pedalboard.bundle, pedalboard.to_dict(), plugins)
+
+    def profile_pedalboard(self, pedalboard):
+        timings = self.pedalboard_loader.timings.get(pedalboard.bundle, {})
+        self.profiler.pedalboard(pedalboard.title, "parsed", **timings)
+
+    def wait_pedalboards_loaded(self, timeout=None):
+        if self.pedalboard_loader_thread is not None:
+            self.pedalboard_loader_thread.join(timeout)
+
     def get_current_pedalboard_bundle_path(self):
-        url = self.root_uri + "pedalboard/current"
         try:
-            resp = req.get(url)
+            resp = self.client.get("pedalboard/current")
             # TODO pass code define
             if resp.status_code == 200:
                 return resp.text
-        except:
+        except req.RequestException:
             return None
 
-    def set_current_pedalboard(self, pedalboard):
+    def set_current_pedalboard(self, pedalboard, presets=None):
+        # presets is the result of get_presets() if the caller has already requested it
         # Delete previous "current"
         del self.current
 
+        # Make sure the pedalboard has been parsed (it might have been selected before the background loader got to it)
+        self.pedalboard_load(pedalboard)
+        if self.caches_dirty:
+            self.schedule_cache_save()
+        self.parameter_commits.forget()
+
         # Create a new "current"
         self.current = self.Current(pedalboard)
 
@@ -452,11 +731,16 @@ class Mod(Handler):
         if config_file.exists():
             with open(config_file.as_posix(), 'r') as ymlfile:
                 cfg = yaml.load(ymlfile, Loader=yaml.SafeLoader)
-        self.hardware.reinit(cfg)
-
-        # Initialize the data
-        self.bind_current_pedalboard()
-        self.load_current_presets()
+        # The footswitches' relays, MIDI and bound parameters are rewritten, keep the hardware poller out meanwhile
+        with self.hardware.paused():
+            self.hardware.reinit(cfg)
+
+            # Initialize the data
+            self.bind_current_pedalboard()
+        if presets is None:
+            self.load_current_presets()
+        else:
+            self.current.presets = presets
         self.update_lcd()
 
         # Selection info
@@ -520,42 +804,73 @@ class Mod(Handler):
 
     def pedalboard_change(self):
         logging.info("Pedalboard change")
+        if self.universal_encoder_mode == UniversalEncoderMode.LOADING:
+            return
         if self.selected_pedalboard_index < len(self.pedalboard_list):
             self.lcd.draw_info_message("Loading...")
+            self.universal_encoder_mode = UniversalEncoderMode.LOADING
+            self.parameter_commits.flush()
+            pedalboard = self.pedalboard_list[self.selected_pedalboard_index]
+            self.commands.submit(self.pedalboard_change_request, (pedalboard,), self.pedalboard_change_done)
 
-            resp1 = req.get(self.root_uri + "reset")
+    def pedalboard_change_request(self, pedalboard):
+        # Runs on the command thread
+        try:
+            resp1 = self.client.get("reset", timeout=ModClient.LONG_TIMEOUT)
             if resp1.status_code != 200:
                 logging.error("Bad Reset request")
 
-            uri = self.root_uri + "pedalboard/load_bundle/"
-            bundlepath = self.pedalboard_list[self.selected_pedalboard_index].bundle
-            data = {"bundlepath": bundlepath}
-            resp2 = req.post(uri, data)
+            uri = "pedalboard/load_bundle/"
+            data = {"bundlepath": pedalboard.bundle}
+            resp2 = self.client.post(uri, timeout=ModClient.LONG_TIMEOUT, data=data)
             if resp2.status_code != 200:
                 logging.error("Bad Rest request: %s %s  status: %d" % (uri, data, resp2.status_code))
-
-            # Now that it's presumably changed, load the dynamic "current" data
-            self.set_current_pedalboard(self.pedalboard_list[self.selected_pedalboard_index])
-            self.bot_encoder_mode = BotEncoderMode.DEFAULT
+        except req.RequestException as e:
+            logging.error("Pedalboard change request failed: %s" % e)
+
+        # Get everything else set_current_pedalboard needs from mod-ui (or disk) while still off the main thread
+        self.pedalboard_load(pedalboard)
+        return pedalboard, self.get_presets()
+
+    def pedalboard_change_done(self, result):
+        # Now that it's presumably changed, load the dynamic "current" data
+        if result is not None:
+            pedalboard, presets = result
+            self.set_current_pedalboard(pedalboard, presets)
+        self.bot_encoder_mode = BotEncoderMode.DEFAULT
+        self.universal_encoder_mode = UniversalEncoderMode.DEFAULT
 
     #
     # Preset Stuff
     #
 
-    def load_current_presets(self):
-        url = self.root_uri + "snapshot/list"
+    def get_presets(self):
+        # {index: name} of the current pedalboard's presets (snapshots), None if they couldn't be requested
         try:
-            resp = req.get(url)
-            if resp.status_code == 200:
-                pass
-        except:
+            resp = self.client.get("snapshot/list")
+        except req.RequestException as e:
+            logging.error("Request failed: snapshot/list %s" % e)
             return None
-        dict = json.loads(resp.text)
+        if resp.status_code != 200:
+            logging.error("Bad Rest request: snapshot/list status: %d" % resp.status_code)
+            return None
+        try:
+            dict = json.loads(resp.text)
+        except ValueError as e:
+            logging.error("Bad snapshot/list response: %s" % e)
+            return None
+        presets = {}
         for key, name in dict.items():
             if key.isdigit():
                 index = int(key)
-                self.current.presets[index] = name
-        return resp.text
+                presets[index] = name
+        return presets
+
+    def load_current_presets(self):
+        presets = self.get_presets()
+        if presets is not None:
+            self.current.presets.update(presets)
+        return presets
 
     def next_preset_index(self, dict, current, incr):
         # This essentially applies modulo to a set of potentially discontinuous keys
@@ -586,47 +901,102 @@ class Mod(Handler):
         self.lcd.draw_title(self.current.pedalboard.title, preset_name, False, True, highlight_only)
 
     def preset_change(self):
+        if self.universal_encoder_mode == UniversalEncoderMode.LOADING:
+            return
         index = self.selected_preset_index
         logging.info("preset change: %d" % index)
         self.lcd.draw_info_message("Loading...")
-        url = (self.root_uri + "snapshot/load?id=%d" % index)
-        # req.get(self.root_uri + "reset")
-        resp = req.get(url)
-        if resp.status_code != 200:
-            logging.error("Bad Rest request: %s status: %d" % (url, resp.status_code))
-        self.current.preset_index = index
+        self.universal_encoder_mode = UniversalEncoderMode.LOADING
+        self.parameter_commits.flush()
+        instance_ids = [p.instance_id for p in self.current.pedalboard.plugins]
+        self.commands.submit(self.preset_change_request, (index, instance_ids), self.preset_change_done)
+
+    def preset_change_request(self, index, instance_ids):
+        # Runs on the command thread
+        url = "snapshot/load?id=%d" % index
+        # self.client.get("reset")
+        try:
+            resp = self.client.get(url, timeout=ModClient.LONG_TIMEOUT)
+            if resp.status_code != 200:
+                logging.error("Bad Rest request: %s status: %d" % (url, resp.status_code))
+        except req.RequestException as e:
+            logging.error("Preset change request failed: %s" % e)
 
         #load of the preset might have changed plugin bypass status
-        self.preset_change_plugin_update()
+        return index, self.get_plugin_states(instance_ids)
+
+    def preset_change_done(self, result):
+        if result is not None:
+            index, states = result
+            self.current.preset_index = index
+            self.preset_change_plugin_update(states)
         self.bot_encoder_mode = BotEncoderMode.DEFAULT
+        self.universal_encoder_mode = UniversalEncoderMode.DEFAULT
+        self.update_lcd_title()
 
     def preset_incr_and_change(self):
         if self.universal_encoder_mode == UniversalEncoderMode.LOADING:
             return
-        self.universal_encoder_mode = UniversalEncoderMode.LOADING
         self.preset_select(1)
         self.preset_change()
-        self.universal_encoder_mode = UniversalEncoderMode.DEFAULT
 
     def preset_decr_and_change(self):
         if self.universal_encoder_mode == UniversalEncoderMode.LOADING:
             return
-        self.universal_encoder_mode = UniversalEncoderMode.LOADING
         self.preset_select(-1)
         self.preset_change()
-        self.universal_encoder_mode = UniversalEncoderMode.DEFAULT
 
-    def preset_change_plugin_update(self):
-        # Now that the preset has changed on the host, update plugin bypass indicators
-        for p in self.current.pedalboard.plugins:
-            uri = self.root_uri + "effect/parameter/pi_stomp_get//graph" + p.instance_id + "/:bypass"
+    def get_plugin_states(self, instance_ids):
+        # {instance_id: {'bypassed': bool, 'ports': {symbol: value}}} for those plugins whose state could be requested
+        # Everything comes from one request if mod-ui has the pi_stomp_get_all endpoint (see setup/mod-tweaks),
+        # otherwise just the bypass values are requested, for all plugins concurrently
+        if self.bulk_get_supported:
             try:
-                resp = req.get(uri)
+                resp = self.client.get("effect/parameter/pi_stomp_get_all")
                 if resp.status_code == 200:
-                    p.set_bypass(resp.text == "true")
-            except:
-                logging.error("failed to get bypass value for: %s" % p.instance_id)
+                    states = {}
+                    for instance, state in json.loads(resp.text).items():
+                        instance_id = instance[len("/graph"):]
+                        if instance_id in instance_ids:
+                            states[instance_id] = state
+                    return states
+                if resp.status_code == 404:
+                    logging.info("mod-ui doesn't support pi_stomp_get_all, requesting bypass values per plugin")
+                    self.bulk_get_supported = False
+                else:
+                    logging.error("Bad Rest request: pi_stomp_get_all status: %d" % resp.status_code)
+            except req.RequestException as e:
+                logging.error("failed to get plugin states: %s" % e)
+
+        if len(instance_ids) == 0:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(ModClient.POOL_SIZE, len(instance_ids))) as executor:
+            values = executor.map(self.get_bypass_value, instance_ids)
+        return {i: {'bypassed': v} for i, v in zip(instance_ids, values) if v is not None}
+
+    def get_bypass_value(self, instance_id):
+        uri = "effect/parameter/pi_stomp_get//graph" + instance_id + "/:bypass"
+        try:
+            resp = self.client.get(uri)
+            if resp.status_code == 200:
+                return resp.text == "true"
+        except req.RequestException:
+            logging.error("failed to get bypass value for: %s" % instance_id)
+        return None
+
+    def preset_change_plugin_update(self, states):
+        # Now that the preset has changed on the host, update plugin bypass indicators and parameter values
+        for p in self.current.pedalboard.plugins:
+            state = states.get(p.instance_id)
+            if state is None:
                 continue
+            for symbol, value in state.get('ports', {}).items():
+                param = p.parameters.get(symbol)
+                if param is not None and param.value != value:
+                    self.plugin_parameter_update(p, param, value)
+            param = p.parameters.get(":bypass")
+            if param is not None:
+                self.plugin_parameter_update(p, param, 1.0 if state['bypassed'] else 0.0)
         self.lcd.draw_tools(SelectedType.WIFI, SelectedType.BYPASS, SelectedType.SYSTEM)
         self.lcd.draw_analog_assignments(self.current.analog_controllers)
         self.lcd.draw_plugins(self.current.pedalboard.plugins)
@@ -656,6 +1026,14 @@ class Mod(Handler):
             self.selected_plugin_index = index
             self.lcd.draw_plugin_select(plugin)
 
+    def plugin_parameter_update(self, plugin, param, value):
+        # The host's value of param changed (not by us), update it and any controller bound to it
+        param.value = value
+        self.parameter_commits.forget((plugin.instance_id, param.symbol))
+        for c in plugin.controllers:
+            if c.parameter is param:
+                c.set_value(value)
+
     def toggle_plugin_bypass(self):
         logging.debug("toggle_plugin_bypass")
         inst = self.get_selected_instance()
@@ -666,16 +1044,20 @@ class Mod(Handler):
                         c.toggle(0)
                         return
             # Regular (non footswitch plugin)
-            url = self.root_uri + "effect/parameter/pi_stomp_set//graph%s/:bypass" % inst.instance_id
             value = inst.toggle_bypass()
-            code = self.parameter_set_send(url, "1" if value else "0", 200)
-            if (code != 200):
-                inst.toggle_bypass()  # toggle back to original value since request wasn't successful
+            self.commands.submit(self.parameter_set, (inst.instance_id, ":bypass", "1" if value else "0"),
+                                 lambda ok: self.toggle_plugin_bypass_done(inst, ok))
 
             #  Indicate change on LCD, and redraw selection(highlight)
             self.update_lcd_plugins()
             self.lcd.draw_plugin_select(inst)  # Not strictly required for original pi-stomp
 
+    def toggle_plugin_bypass_done(self, inst, ok):
+        if not ok:
+            inst.toggle_bypass()  # toggle back to original value since request wasn't successful
+            self.update_lcd_plugins()
+            self.lcd.draw_plugin_select(inst)
+
     #
     # Generic Menu functions
     #
@@ -715,24 +1097,12 @@ class Mod(Handler):
     #
 
     def system_info_load(self):
-        cmd = "/usr/bin/patchbox wifi status"
-        output = subprocess.check_output(cmd, shell=True)
-        for i in output.decode().split('\n'):
-            if len(i) is 0:
-                continue
-            (key, value) = i.split('=')
-            if key and value:
-                self.wifi_status[key] = value
-        self.lcd.update_wifi(self.wifi_status)
+        # Collected in the background, the LCD is updated (by system_info_wifi_change) once the wifi status is known
+        self.system_info.start()
 
-        try:
-            output = subprocess.check_output(['git', '--git-dir', self.homedir + '/.git',
-                                              '--work-tree', self.homedir, 'describe'])
-            if output:
-                self.git_describe = output.decode()
-                self.software_version = self.git_describe.split('-')[0]
-        except subprocess.CalledProcessError:
-            logging.error("Cannot obtain git software tag info")
+    def system_info_wifi_change(self, wifi_status):
+        self.wifi_status = wifi_status
+        self.lcd.update_wifi(self.wifi_status)
 
     def system_menu_show(self):
         self.menu_items = {"0": {Token.NAME: "< Back to main screen", Token.ACTION: self.menu_back},
@@ -750,7 +1120,7 @@ class Mod(Handler):
 
     def system_info_show(self):
         self.menu_items = {"0": {Token.NAME: "< Back to main screen", Token.ACTION: self.menu_back}}
-        self.menu_items["SW:"] = {Token.NAME: self.git_describe, Token.ACTION: None}
+        self.menu_items["SW:"] = {Token.NAME: self.system_info.git_describe, Token.ACTION: None}
         hotspot_active = False
         key = 'hotspot_active'
         if key in self.wifi_status:
@@ -770,17 +1140,21 @@ class Mod(Handler):
         self.lcd.menu_highlight(0)
 
     def system_disable_hotspot(self):
-        self.system_toggle_hotspot("Disabling, please wait...", "/usr/bin/patchbox wifi hotspot down")
+        self.system_toggle_hotspot("Disabling, please wait...", False)
 
     def system_enable_hotspot(self):
-        self.system_toggle_hotspot("Enabling, please wait...", "/usr/bin/patchbox wifi hotspot up")
+        self.system_toggle_hotspot("Enabling, please wait...", True)
 
-    def system_toggle_hotspot(self, msg, cmd):
+    def system_toggle_hotspot(self, msg, enable):
+        # Switched (and the wifi status refreshed) by the system info thread, the UI stays responsive meanwhile
         self.lcd.draw_info_message(msg)
-        subprocess.check_output(cmd, shell=True)
-        time.sleep(2)  # Give networking time to settle before refreshing info
-        self.system_info_load()
-        self.system_info_show()
+        self.system_info.set_hotspot(enable, self.system_toggle_hotspot_done)
+
+    def system_toggle_hotspot_done(self, enabled):
+        # Show the refreshed info, unless the user has left the system menu meanwhile
+        if (self.top_encoder_mode == TopEncoderMode.SYSTEM_MENU or
+                self.universal_encoder_mode == UniversalEncoderMode.SYSTEM_MENU):
+            self.system_info_show()
 
     def system_menu_save_current_pb(self):
         logging.debug("save current")
@@ -788,15 +1162,20 @@ class Mod(Handler):
         # Figure out how to save preset (host.py:preset_save_replace)
         # TODO this also causes a problem if self.current.pedalboard.title != mod-host title
         # which can happen if the pedalboard is changed via MOD UI, not via hardware
-        url = self.root_uri + "pedalboard/save"
+        self.commands.submit(self.save_current_pb_request, (self.current.pedalboard.title,))
+
+    def save_current_pb_request(self, title):
+        # Runs on the command thread
+        url = "pedalboard/save"
         try:
-            resp = req.post(url, data={"asNew": "0", "title": self.current.pedalboard.title})
+            resp = self.client.post(url, timeout=ModClient.LONG_TIMEOUT,
+                                    data={"asNew": "0", "title": title})
             if resp.status_code != 200:
                 logging.error("Bad Rest request: %s status: %d" % (url, resp.status_code))
             else:
                 logging.debug("saved")
-        except:
-            logging.error("status %s" % resp.status_code)
+        except req.RequestException as e:
+            logging.error("Save request failed: %s" % e)
             return
 
     def system_menu_reload(self):
@@ -872,6 +1251,7 @@ class Mod(Handler):
     #
 
     def parameter_edit_show(self, selected=0):
+        self.parameter_commits.flush()  # Send the final value of any parameter just edited
         plugin = self.get_selected_instance()
         self.deep = self.Deep(plugin)  # TODO this creates a new obj every time menu is shown, singleton?
         self.deep.selected_parameter_index = 0
@@ -916,24 +1296,87 @@ class Mod(Handler):
 
     def parameter_value_commit(self):
         param = self.deep.selected_parameter
-        url = self.root_uri + "effect/parameter/pi_stomp_set//graph%s/%s" % (self.deep.plugin.instance_id, param.symbol)
         formatted_value = ("%.1f" % param.value)
-        self.parameter_set_send(url, formatted_value, 200)
+        self.parameter_commits.set((self.deep.plugin.instance_id, param.symbol), formatted_value)
+        if self.reactor is not None and len(self.parameter_commits.pending) > 0 and \
+                self.parameter_commits_timer is None:
+            # Held back by the rate limit, make sure it gets sent.  Later values just replace the pending one
+            self.parameter_commits_timer = self.reactor.call_later(self.parameter_commits.delay(),
+                                                                   self.parameter_commits_timer_expired)
+
+    def parameter_commits_timer_expired(self):
+        self.parameter_commits_timer = None
+        self.parameter_commits.poll()
+        if len(self.parameter_commits.pending) > 0:
+            self.parameter_commits_timer = self.reactor.call_later(self.parameter_commits.delay(),
+                                                                   self.parameter_commits_timer_expired)
+
+    def parameter_commits_send(self, updates):
+        # Called by the parameter coalescer with [((instance_id, symbol), formatted_value), ...]
+        if len(updates) == 1:
+            (instance_id, symbol), value = updates[0]
+            self.commands.submit(self.parameter_set, (instance_id, symbol, value))
+        else:
+            self.commands.submit(self.parameter_set_bulk, ([(i, s, v) for (i, s), v in updates],))
+
+    @staticmethod
+    def parameter_url(instance_id, symbol):
+        return "effect/parameter/pi_stomp_set//graph%s/%s" % (instance_id, symbol)
+
+    def parameter_set_bulk(self, updates):
+        # Set several parameters, updates is a list of (instance_id, symbol, value).  Returns a list with True for
+        # each update which was applied.  All are sent in one request if mod-ui has the pi_stomp_set_all endpoint
+        # (see setup/mod-tweaks), otherwise one request is made per update
+        if len(updates) == 0:
+            return []
+        if self.bulk_set_supported:
+            items = [{"port": "/graph%s/%s" % (instance_id, symbol), "value": value}
+                     for instance_id, symbol, value in updates]
+            try:
+                resp = self.client.post("effect/parameter/pi_stomp_set_all", json={"parameters": items})
+            except req.RequestException as e:
+                logging.error("Request failed: pi_stomp_set_all %s" % e)
+                return [False] * len(updates)
+            if resp.status_code == 200:
+                try:
+                    results = json.loads(resp.text)
+                except ValueError:
+                    results = None
+                if isinstance(results, list) and len(results) == len(updates):
+                    return [bool(r) for r in results]
+                # Not our endpoint's reply (eg. mod-ui serving a page for unknown paths)
+                logging.info("mod-ui doesn't support pi_stomp_set_all, setting parameters one at a time")
+                self.bulk_set_supported = False
+            elif resp.status_code in (404, 405):
+                logging.info("mod-ui doesn't support pi_stomp_set_all, setting parameters one at a time")
+                self.bulk_set_supported = False
+            else:
+                logging.error("Bad Rest request: pi_stomp_set_all status: %d, setting parameters one at a time" %
+                              resp.status_code)
+
+        return [self.parameter_set_send(self.parameter_url(instance_id, symbol), value, 200) == 200
+                for instance_id, symbol, value in updates]
+
+    def parameter_set(self, instance_id, symbol, value):
+        # Set a plugin parameter (symbol ":bypass" for bypass).  Returns True if successful
+        return self.parameter_set_send(self.parameter_url(instance_id, symbol), value, 200) == 200
 
     def parameter_set_send(self, url, value, expect_code):
+        # Returns the response status code, None if the request couldn't be made
         logging.debug("request: %s" % url)
+        if value is None:
+            return None
+        logging.debug("value: %s" % value)
         try:
-            resp = None
-            if value is not None:
-                logging.debug("value: %s" % value)
-                resp = req.post(url, json={"value": value})
-            if resp.status_code != expect_code:
-                logging.error("Bad Rest request: %s status: %d" % (url, resp.status_code))
-            else:
-                logging.debug("Parameter changed to: %d" % value)
-        except:
-            logging.debug("status: %s" % resp.status_code)
-            return resp.status_code
+            resp = self.client.post(url, json={"value": value})
+        except req.RequestException as e:
+            logging.error("Request failed: %s %s" % (url, e))
+            return None
+        if resp.status_code != expect_code:
+            logging.error("Bad Rest request: %s status: %d" % (url, resp.status_code))
+        else:
+            logging.debug("Parameter changed to: %s" % value)
+        return resp.status_code
 
     #
     # LCD Stuff
@@ -968,6 +1411,20 @@ class Mod(Handler):
         self.lcd.draw_plugins(self.current.pedalboard.plugins)
 
     def update_lcd_fs(self, bypass_change=False):
+        if self.reactor is None:
+            self.draw_lcd_fs(bypass_change)
+            return
+        # Drawn by lcd_refresh (at LCD_INTERVAL), so a burst of footswitch changes costs one redraw
+        self.lcd_fs_dirty = True
+        self.lcd_bypass_dirty = self.lcd_bypass_dirty or bypass_change
+
+    def lcd_refresh(self):
+        if self.lcd_fs_dirty:
+            self.draw_lcd_fs(self.lcd_bypass_dirty)
+            self.lcd_fs_dirty = False
+            self.lcd_bypass_dirty = False
+
+    def draw_lcd_fs(self, bypass_change):
         if bypass_change:
             self.lcd.update_bypass(self.hardware.relay.enabled)
         self.lcd.draw_bound_plugins(self.current.pedalboard.plugins, self.hardware.footswitches)
@@ -0,0 +1,122 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import os
+import requests as req
+import threading
+import time
+import urllib.parse
+
+from requests.adapters import HTTPAdapter
+
+# requests-unixsocket is optional, without it requests go over TCP
+import importlib.util
+unixsocket_available = importlib.util.find_spec("requests_unixsocket")
+if unixsocket_available:
+    import requests_unixsocket
+
+# Seconds to wait for mod-ui, (connect, read).  Loading a pedalboard can legitimately take a while
+DEFAULT_TIMEOUT = (2, 5)
+LONG_TIMEOUT = (2, 30)
+
+# Enough for the concurrent effect/get requests made while loading pedalboards
+POOL_SIZE = 10
+
+# mod-ui also listens here when patched by setup/mod-tweaks (webserver.diff)
+UNIX_SOCKET = "/var/modep/mod-ui.sock"
+
+
+class ModClient:
+
+    # HTTP client for all requests to mod-ui.  A single keep-alive session (connection pool) is shared, so
+    # parameter changes don't pay for a new TCP connection each time, and every request has a timeout so a
+    # hung mod-ui can't block forever.  Request count/latency is kept per endpoint.
+    # mod-ui's unix socket is used instead of TCP when it exists (and requests-unixsocket is installed).
+
+    def __init__(self, root_uri, unix_socket=UNIX_SOCKET):
+        self.root_uri = root_uri
+        self.tcp_session = req.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.tcp_session.mount("http://", adapter)
+        # (session, base uri) of the transport in use.  Requests are made from several threads, so it's only ever
+        # replaced as a whole (under lock), and each request reads it once
+        self.tcp_transport = (self.tcp_session, root_uri)
+        self.transport = self.tcp_transport
+        if unix_socket is not None and unixsocket_available and os.path.exists(unix_socket):
+            self.transport = (requests_unixsocket.Session(),
+                              "http+unix://%s/" % urllib.parse.quote(unix_socket, safe=""))
+            logging.info("Using mod-ui unix socket: %s" % unix_socket)
+        self.lock = threading.Lock()
+        self.latency = {}  # endpoint: [count, errors, total_seconds, max_seconds]
+
+    def using_unix_socket(self):
+        return self.transport is not self.tcp_transport
+
+    @staticmethod
+    def endpoint(path):
+        # Group requests by the first two path components (eg. "effect/parameter", "snapshot/load")
+        return "/".join(path.split('?', 1)[0].split('/')[:2])
+
+    def request(self, method, path, timeout=DEFAULT_TIMEOUT, **kwargs):
+        # Raises requests.RequestException (eg. Timeout, ConnectionError) on failure
+        start = time.monotonic()
+        error = True
+        try:
+            transport = self.transport
+            session, base_uri = transport
+            try:
+                resp = session.request(method, base_uri + path, timeout=timeout, **kwargs)
+            except req.ConnectionError:
+                if transport is self.tcp_transport:
+                    raise
+                with self.lock:
+                    if self.transport is transport:
+                        logging.warning("mod-ui unix socket not available, using TCP")
+                        self.transport = self.tcp_transport
+                session, base_uri = self.tcp_transport
+                resp = session.request(method, base_uri + path, timeout=timeout, **kwargs)
+            error = False
+            return resp
+        finally:
+            self.record(self.endpoint(path), time.monotonic() - start, error)
+
+    def get(self, path, timeout=DEFAULT_TIMEOUT, **kwargs):
+        return self.request("GET", path, timeout, **kwargs)
+
+    def post(self, path, timeout=DEFAULT_TIMEOUT, **kwargs):
+        return self.request("POST", path, timeout, **kwargs)
+
+    def record(self, endpoint, seconds, error):
+        with self.lock:
+            stats = self.latency.get(endpoint)
+            if stats is None:
+                stats = self.latency[endpoint] = [0, 0, 0.0, 0.0]
+            stats[0] += 1
+            if error:
+                stats[1] += 1
+            stats[2] += seconds
+            stats[3] = max(stats[3], seconds)
+
+    def stats(self):
+        # {endpoint: {count, errors, avg_ms, max_ms}}
+        with self.lock:
+            return {e: {'count': s[0], 'errors': s[1], 'avg_ms': round(s[2] * 1000 / s[0], 2),
+                        'max_ms': round(s[3] * 1000, 2)} for e, s in self.latency.items()}
+
+    def log_stats(self):
+        for endpoint, s in sorted(self.stats().items()):
+            logging.info("mod-ui %s: %d requests, %d errors, avg %.2fms, max %.2fms" %
+                         (endpoint, s['count'], s['errors'], s['avg_ms'], s['max_ms']))
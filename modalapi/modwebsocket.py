@@ -0,0 +1,143 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import queue
+import threading
+import time
+
+# websocket-client is optional, without it changes made via MOD UI are detected by polling
+import importlib.util
+websocket_available = importlib.util.find_spec("websocket")
+if websocket_available:
+    import websocket
+
+# Events (first item of the tuples returned by parse_message)
+PARAM_SET = "param_set"            # (PARAM_SET, instance_id, symbol, value)
+LOADING_START = "loading_start"    # (LOADING_START,)
+LOADING_END = "loading_end"        # (LOADING_END, preset_index)
+PEDAL_SNAPSHOT = "pedal_snapshot"  # (PEDAL_SNAPSHOT, preset_index, name)
+
+GRAPH_PREFIX = "/graph"
+
+# Seconds between connection attempts, and to block in recv (so stop() is noticed)
+RETRY_INTERVAL = 5
+RECV_TIMEOUT = 1
+
+
+def parse_message(msg):
+    # Convert a mod-ui websocket message to an event tuple.  None for messages of no interest
+    words = msg.split(" ", 3)
+    cmd = words[0]
+    try:
+        if cmd == PARAM_SET and len(words) == 4:
+            # param_set /graph/<instance> <symbol> <value>
+            if not words[1].startswith(GRAPH_PREFIX + "/"):
+                return None
+            return PARAM_SET, words[1][len(GRAPH_PREFIX):], words[2], float(words[3])
+        elif cmd == LOADING_START:
+            return LOADING_START,
+        elif cmd == LOADING_END:
+            return LOADING_END, int(words[1]) if len(words) > 1 else -1
+        elif cmd == PEDAL_SNAPSHOT and len(words) >= 2:
+            return PEDAL_SNAPSHOT, int(words[1]), " ".join(words[2:])
+    except ValueError:
+        logging.debug("Unexpected mod-ui message: %s" % msg)
+    return None
+
+
+class ModWebSocket:
+
+    # Subscriber to mod-ui's websocket, the same event stream the web UI uses to stay in sync.
+    # A thread receives the messages, keeps the connection alive (answers ping and data_ready) and queues the
+    # events of interest.  Those are taken off the queue by the main loop via poll(), so all changes to the
+    # pedalboard/LCD still happen on the main thread.  The connection is retried while mod-ui is unavailable.
+
+    def __init__(self, url):
+        self.url = url
+        self.events = queue.Queue()
+        self.connected = False
+        self.running = False
+        self.thread = None
+        self.ws = None
+        self.wakeup = None  # if set, called (from the websocket thread) when an event is queued
+
+    @staticmethod
+    def available():
+        return websocket_available is not None
+
+    def start(self):
+        if not self.available() or self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="mod-ui-websocket", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(RECV_TIMEOUT * 2)
+            self.thread = None
+
+    def run(self):
+        while self.running:
+            try:
+                self.ws = websocket.create_connection(self.url, timeout=RECV_TIMEOUT)
+            except Exception as e:
+                logging.debug("Cannot connect to %s: %s" % (self.url, e))
+                time.sleep(RETRY_INTERVAL)
+                continue
+
+            logging.info("Subscribed to mod-ui events: %s" % self.url)
+            self.connected = True
+            try:
+                while self.running:
+                    try:
+                        msg = self.ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    if not msg:
+                        break  # closed by mod-ui
+                    self.handle_message(msg)
+            except Exception as e:
+                logging.info("mod-ui websocket closed: %s" % e)
+            finally:
+                self.connected = False
+                self.ws.close()
+                self.ws = None
+
+    def handle_message(self, msg):
+        if isinstance(msg, bytes):
+            msg = msg.decode("utf-8", "replace")
+        if msg == "ping":
+            self.ws.send("pong")
+        elif msg.startswith("data_ready"):
+            # mod-ui holds back further output until this is acknowledged
+            self.ws.send(msg)
+        else:
+            event = parse_message(msg)
+            if event is not None:
+                self.events.put(event)
+                if self.wakeup is not None:
+                    self.wakeup()
+
+    def poll(self):
+        # Returns the list of events received since the last poll
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
@@ -0,0 +1,76 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import fcntl
+import os
+import socket
+import struct
+
+SYSFS_NET = "/sys/class/net"
+HOSTAPD_CONTROL_DIR = "/var/run/hostapd"
+INTERFACE = "wlan0"
+
+SIOCGIFADDR = 0x8915
+
+
+def interface_address(interface):
+    # IPv4 address of the interface, None if it has none
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        res = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', interface[:15].encode()))
+        return socket.inet_ntoa(res[20:24])
+    except OSError:
+        return None
+    finally:
+        s.close()
+
+
+class NetworkStatus:
+
+    # Reads the wifi state directly from the kernel (sysfs and an ioctl for the address) and hostapd (its control
+    # socket exists while it's serving the interface), instead of running "patchbox wifi status".  Cheap enough
+    # to poll every few seconds.  The paths can point at a fake tree for testing (see util/network_status.py)
+
+    def __init__(self, interface=INTERFACE, sysfs_root=SYSFS_NET, hostapd_dir=HOSTAPD_CONTROL_DIR,
+                 get_address=interface_address):
+        self.interface = interface
+        self.sysfs_root = sysfs_root
+        self.hostapd_dir = hostapd_dir
+        self.get_address = get_address
+
+    def available(self):
+        # False if the kernel has no such interface (eg. no wifi adapter, or one named differently)
+        return os.path.isdir(os.path.join(self.sysfs_root, self.interface))
+
+    def read_attr(self, name):
+        try:
+            with open(os.path.join(self.sysfs_root, self.interface, name), 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def status(self):
+        # Same keys and values as "patchbox wifi status" (the ones pi-stomp uses)
+        operstate = self.read_attr("operstate")
+        up = operstate == "up"
+        hotspot = up and os.path.exists(os.path.join(self.hostapd_dir, self.interface))
+        address = self.get_address(self.interface) if up else None
+        status = {
+            'hotspot_active': "1" if hotspot else "0",
+            'wifi_connected': "1" if up and not hotspot else "0"
+        }
+        if address:
+            status['ip_address'] = address
+        return status
@@ -30,6 +30,18 @@ class Parameter:
         self.value = value
         self.binding = binding
 
+    def to_dict(self):
+        return {Token.NAME: self.name, Token.SYMBOL: self.symbol, Token.MINIMUM: self.minimum,
+                Token.MAXIMUM: self.maximum, Token.VALUE: self.value, Token.BINDING: self.binding}
+
+    @staticmethod
+    def from_dict(d):
+        # Rebuild a Parameter from the output of to_dict (eg. from the pedalboard cache)
+        info = {Token.NAME: util.DICT_GET(d, Token.NAME), Token.SYMBOL: util.DICT_GET(d, Token.SYMBOL),
+                Token.RANGES: {Token.MINIMUM: util.DICT_GET(d, Token.MINIMUM),
+                               Token.MAXIMUM: util.DICT_GET(d, Token.MAXIMUM)}}
+        return Parameter(info, util.DICT_GET(d, Token.VALUE), util.DICT_GET(d, Token.BINDING))
+
     def to_json(self):
         return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4)
 
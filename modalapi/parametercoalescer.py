@@ -0,0 +1,66 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+
+# Maximum number of times per second pending values are sent
+MAX_RATE = 10
+
+
+class ParameterCoalescer:
+
+    # Collects parameter changes (eg. from an encoder being spun) and sends them at a limited rate.
+    # Only the newest value of each parameter is kept while waiting to send, and a value is not sent again if
+    # its formatted representation is the same as the last one sent for that parameter.
+    # Values are sent from poll() (called from the main loop) so the last value always gets sent,
+    # or immediately by flush() (eg. when leaving value edit).
+
+    def __init__(self, send, max_rate=MAX_RATE):
+        self.send = send          # send([(key, formatted_value), ...])
+        self.interval = 1.0 / max_rate
+        self.pending = {}         # key: formatted value, in order of first change
+        self.last_sent = {}       # key: formatted value
+        self.next_send_time = 0
+
+    def set(self, key, formatted_value):
+        self.pending[key] = formatted_value
+        self.poll()
+
+    def delay(self):
+        # Seconds until pending values may be sent
+        return max(0, self.next_send_time - time.monotonic())
+
+    def poll(self):
+        if len(self.pending) > 0 and time.monotonic() >= self.next_send_time:
+            self.flush()
+
+    def flush(self):
+        # All changed values are sent together, so they can be sent in one request
+        pending = self.pending
+        self.pending = {}
+        updates = [(key, value) for key, value in pending.items() if self.last_sent.get(key) != value]
+        if len(updates) == 0:
+            return
+        self.send(updates)
+        self.last_sent.update(updates)
+        self.next_send_time = time.monotonic() + self.interval
+
+    def forget(self, key=None):
+        # The value held by the host changed some other way (or the pedalboard changed), so the next value for key
+        # (all keys if None) must be sent even if it matches the last one sent
+        if key is None:
+            self.last_sent.clear()
+        else:
+            self.last_sent.pop(key, None)
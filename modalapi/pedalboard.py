@@ -14,240 +14,92 @@
 # along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
 
 import json
-import lilv
 import logging
-import operator
-import os
-import requests as req
-import sys
-import urllib.parse
 
 import common.token as Token
 import common.util as util
 import modalapi.parameter as Parameter
 import modalapi.plugin as Plugin
+import modalapi.plugincache as PluginCache
+import modalapi.signalgraph as SignalGraph
 
 class Pedalboard:
 
     def __init__(self, title, bundle):
-        self.root_uri = "http://localhost:80/"
         self.title = title
         self.bundle = bundle  # TODO used?
         self.plugins = []
+        self.plugin_uris = []  # unique URIs of the plugins used, set when the bundle data is loaded
+        self.loaded = False  # False until the plugin data has been parsed (or restored from cache)
 
-        self.world = lilv.World()
-
-        # this is needed when loading specific bundles instead of load_all
-        # (these functions are not exposed via World yet)
-        self.world.load_specifications()
-        self.world.load_plugin_classes()
-
-        self.uri_block = self.world.new_uri("http://drobilla.net/ns/ingen#block")
-        self.uri_head  = self.world.new_uri("http://drobilla.net/ns/ingen#head")
-        self.uri_port  = self.world.new_uri("http://lv2plug.in/ns/lv2core#port")
-        self.uri_tail  = self.world.new_uri("http://drobilla.net/ns/ingen#tail")
-        self.uri_value = self.world.new_uri("http://drobilla.net/ns/ingen#value")
-
-    def get_pedalboard_plugin(self, world, bundlepath):
-        # lilv wants the last character as the separator
-        bundle = os.path.abspath(bundlepath)
-        if not bundle.endswith(os.sep):
-            bundle += os.sep
-        # convert bundle string into a lilv node
-        bundlenode = self.world.new_file_uri(None, bundle)
-
-        # load the bundle
-        self.world.load_bundle(bundlenode)
-
-        # free bundlenode, no longer needed
-        #self.world.node_free(bundlenode)  # TODO find out why this is no longer necessary (why did API method go away)
-
-        # get all plugins in the bundle
-        ps = self.world.get_all_plugins()
-
-        # make sure the bundle includes 1 and only 1 plugin (the pedalboard)
-        if len(ps) != 1:
-            raise Exception('get_pedalboard_info(%s) - bundle has 0 or > 1 plugin'.format(bundle))
-
-        # no indexing in python-lilv yet, just get the first item
-        plugin = None
-        for p in ps:
-            plugin = p
-            break
-
-        if plugin is None:
-            raise Exception('get_pedalboard_plugin(%s)'.format(bundle))
-
-        return plugin
-
-    def get_plugin_data(self, uri):
-        url = self.root_uri + "effect/get?uri=" + urllib.parse.quote(uri)
-        try:
-            resp = req.get(url, headers={'Cache-Control': 'no-cache', 'Pragma': 'no-cache'})
-        except:  # TODO
-            logging.error("Cannot connect to mod-host.")
-            sys.exit()
-
-        if resp.status_code != 200:
-            logging.error("mod-host not able to get plugin data: %s\nStatus: %s" % (url, resp.status_code))
-            return {}
-            #sys.exit()
-
-        return json.loads(resp.text)
-
-    def chase_tail(self, block, conn):
-        if block is None:
-            return
-        conn.append(block)
-
-        ports = self.world.find_nodes(block, self.uri_port, None)
-        for port in ports:
-            tail = self.world.get(None, self.uri_tail, port)
-            if tail is None:
-                continue
-            head = self.world.get(tail, self.uri_head, None)
-            if head is not None:
-                block = self.world.get(None, self.uri_port, head)
-                if block is not None and block not in conn:
-                    self.chase_tail(block, conn)
-            break
-        return conn
-
-    # Get info from an lv2 bundle
-    # @a bundle is a string, consisting of a directory in the filesystem (absolute pathname).
-    def load_bundle(self, bundlepath, plugin_dict):
-        # Load the bundle, return the single plugin for the pedalboard
-        plugin = self.get_pedalboard_plugin(self.world, bundlepath)
-
-        # check if the plugin is a pedalboard
-        def fill_in_type(node):
-            if node is not None and node.is_uri():
-                return node
-            return None
-
-        u = self.world.new_uri("http://www.w3.org/1999/02/22-rdf-syntax-ns#type")
-        plugin_types = [i for i in util.LILV_FOREACH(plugin.get_value(u), fill_in_type)]
-        if "http://moddevices.com/ns/modpedal#Pedalboard" not in plugin_types:
-            raise Exception('get_pedalboard_info(%s) - plugin has no mod:Pedalboard type'.format(bundlepath))
-
-        # Walk ports starting from capture1 to determine general plugin order
-        # TODO can this be generalized to use the chase_tail function?
-        plugin_order = []
-        ports = plugin.get_value(self.uri_port)
-        for port in ports:
-            if port is None:
-                continue
-            tail = self.world.get(None, self.uri_tail, port)   # TODO could end up being capture2
-            if tail is None:
-                continue
-            head = self.world.get(tail, self.uri_head, None)
-            if head is not None:
-                block = self.world.get(None, self.uri_port, head)
-                if block is not None:
-                    self.chase_tail(block, plugin_order)
-            break
-
+    # Create the Plugin/Parameter objects from the data extracted by BundleLoader (see PedalboardLoader)
+    # @a plugin_dict is the {plugin_uri: plugin_info} of all plugins, already fetched from mod-ui
+    # @a port_index is the {plugin_uri: {symbol: port_info}} lookup shared by all pedalboards, filled as needed
+    def load_bundle_data(self, data, plugin_dict, port_index):
         # Iterate blocks (plugins)
-        plugins_unordered = {}
-        plugins_extra = []
-        blocks = plugin.get_value(self.uri_block)
-        for block in blocks:
-            if block is None or block.is_blank():
-                continue
+        plugins = []
+        plugin_uris = {}
+        for block in data['blocks']:
+            instance_id = block[Token.INSTANCE_ID]
 
-            # Add plugin data (from plugin registry) to global plugin dictionary
-            plugin_info = {}
+            # Plugin data (from plugin registry)
             category = None
-            prototype = self.world.find_nodes(block, self.world.ns.lv2.prototype, None)
-            if len(prototype) > 0:
-                #logging.debug("prototype %s" % prototype[0])
-                plugin_uri = str(prototype[0])  # plugin.get_uri()
-                if plugin_uri not in plugin_dict:
-                    plugin_info = self.get_plugin_data(plugin_uri)
-                    if plugin_info:
-                        logging.debug("added %s" % plugin_uri)
-                        plugin_dict[plugin_uri] = plugin_info
-                else:
-                    plugin_info = plugin_dict[plugin_uri]
-                if plugin_info is not None:
-                    cat = util.DICT_GET(plugin_info, Token.CATEGORY)
-                    if cat is not None:
-                        category = cat[0]
+            plugin_uri = block['plugin_uri']
+            if plugin_uri is not None:
+                plugin_uris[plugin_uri] = None
+            plugin_info = plugin_dict.get(plugin_uri, {})
+            cat = util.DICT_GET(plugin_info, Token.CATEGORY)
+            if cat is not None:
+                category = cat[0]
+
+            ports_by_symbol = port_index.get(plugin_uri)
+            if ports_by_symbol is None:
+                ports_by_symbol = PluginCache.control_input_index(plugin_info)
+                if ports_by_symbol is not None and plugin_uri is not None:
+                    port_index[plugin_uri] = ports_by_symbol
 
             # Extract Parameter data
-            instance_id = str(block.get_path()).replace(bundlepath, "", 1)
-            nodes = self.world.find_nodes(block, self.world.ns.lv2.port, None)
             parameters = {}
-            if len(nodes) > 0:
-                # These are the port nodes used to define parameter controls
-                for port in nodes:
-                    param_value = self.world.get(port, self.uri_value, None)
-                    #logging.debug("port: %s  value: %s" % (port, param_value))
-                    binding = self.world.get(port, self.world.ns.midi.binding, None)
-                    if binding is not None:
-                        controller_num = self.world.get(binding, self.world.ns.midi.controllerNumber, None)
-                        channel = self.world.get(binding, self.world.ns.midi.channel, None)
-                        if (controller_num is not None) and (channel is not None):
-                            binding = "%d:%d" % (self.world.new_int(channel), self.world.new_int(controller_num))
-                            logging.debug("  MIDI CC binding %s" % binding)
-                    path = str(port)
-                    symbol = os.path.basename(path)
-                    value = None
-                    if param_value is not None:
-                        if param_value.is_float():
-                            value = float(self.world.new_float(param_value))
-                        elif param_value.is_int():
-                            value = int(self.world.new_int(param_value))
-                        else:
-                            value = str(value)
-                    # Bypass "parameter" is a special case without an entry in the plugin definition
-                    if symbol == Token.COLON_BYPASS:
-                        info = {"shortName": "bypass", "symbol": symbol, "ranges": {"minimum": 0, "maximum": 1}}  # TODO tokenize
-                        v = False if value is 0 else True
-                        param = Parameter.Parameter(info, v, binding)
-                        parameters[symbol] = param
-                        continue  # don't try to find matching symbol in plugin_dict
-                    # Try to find a matching symbol in plugin_dict to obtain the remaining param details
-                    try:
-                        plugin_params = plugin_info[Token.PORTS][Token.CONTROL][Token.INPUT]
-                    except KeyError:
-                        logging.warning("plugin port info not found, could be missing LV2 for: %s", instance_id)
-                        continue
-                    for pp in plugin_params:
-                        sym = util.DICT_GET(pp, Token.SYMBOL)
-                        if sym == symbol:
-                            #logging.debug("PARAM: %s %s %s" % (util.DICT_GET(pp, 'name'), info[uri], category))
-                            param = Parameter.Parameter(pp, value, binding)
-                            #logging.debug("Param: %s %s %4.2f %4.2f %s" % (param.name, param.symbol, param.minimum, value, binding))
-                            parameters[symbol] = param
+            for port in block[Token.PORTS]:
+                symbol = port[Token.SYMBOL]
+                value = port[Token.VALUE]
+                binding = port[Token.BINDING]
+                # Bypass "parameter" is a special case without an entry in the plugin definition
+                if symbol == Token.COLON_BYPASS:
+                    info = {"shortName": "bypass", "symbol": symbol, "ranges": {"minimum": 0, "maximum": 1}}  # TODO tokenize
+                    v = False if value == 0 else True
+                    param = Parameter.Parameter(info, v, binding)
+                    parameters[symbol] = param
+                    continue  # don't try to find matching symbol in plugin_dict
+                # Find the matching symbol in the plugin info to obtain the remaining param details
+                if ports_by_symbol is None:
+                    logging.warning("plugin port info not found, could be missing LV2 for: %s", instance_id)
+                    continue
+                pp = ports_by_symbol.get(symbol)
+                if pp is not None:
+                    parameters[symbol] = Parameter.Parameter(pp, value, binding)
 
-                    #logging.debug("  Label: %s" % label)
             inst = Plugin.Plugin(instance_id, parameters, plugin_info, category)
-
-            try:
-                index = plugin_order.index(block)
-                plugins_unordered[index] = inst
-            except:
-                plugins_extra.append(inst)
+            plugins.append(inst)
             #logging.debug("dump: %s" % inst.to_json())
 
-        # Add "extra" plugins (those not part of the tail_chase order) to the plugins_unordered dict
-        max_index = len(plugins_unordered)
-        for e in plugins_extra:
-            plugins_unordered[max_index] = e
-            max_index = max_index + 1
-
-        # Sort the dictionary based on their order index and add to the pedalboard.plugin list
-        # TODO improve the creation (tail chasing, sorting, dict>list conversion)
-        if max_index > 0:
-            sorted_dict = dict(sorted(plugins_unordered.items(), key=operator.itemgetter(0)))
-            for i in range(0, len(sorted_dict)):
-                val = sorted_dict.get(i)
-                if val is not None:
-                    self.plugins.append(val)
-
-        # Done obtaining relevant lilv for the pedalboard
-        return
+        # Order plugins by signal flow
+        graph = SignalGraph.SignalGraph()
+        for plugin in plugins:
+            graph.add_block(plugin.instance_id)
+        for tail, head in data['arcs']:
+            graph.add_arc(tail, head)
+        self.plugins = sorted(plugins, key=lambda p: graph.index(p.instance_id))
+        self.plugin_uris = list(plugin_uris)
+        self.loaded = True
+
+    def to_dict(self):
+        return {Token.PLUGINS: [p.to_dict() for p in self.plugins]}
+
+    def load_dict(self, d):
+        # Populate plugins from the output of to_dict (eg. from the pedalboard cache) instead of parsing the bundle
+        self.plugins = [Plugin.Plugin.from_dict(p) for p in util.DICT_GET(d, Token.PLUGINS) or []]
+        self.loaded = True
 
     def to_json(self):
         return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4)
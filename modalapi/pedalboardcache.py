@@ -0,0 +1,69 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+
+import common.util as util
+import modalapi.jsoncache as jsoncache
+
+# Bump this whenever the format of the cached pedalboard data changes so stale caches get discarded
+CACHE_VERSION = 4
+
+
+class PedalboardCache(jsoncache.JsonCache):
+
+    # On-disk cache of the data extracted from pedalboard bundles.  Each entry is keyed by bundle path and
+    # carries a signature of the bundle's TTL files, plus the signature (see PluginCache.plugin_signature) of
+    # each plugin it uses.  An entry is only used if all of these still match, so a pedalboard saved (or
+    # modified) via MOD UI, or using a plugin which has been upgraded since, is re-parsed, while all others are
+    # loaded from the cache.
+
+    def __init__(self, cache_file):
+        super(PedalboardCache, self).__init__(cache_file, CACHE_VERSION)
+
+    @staticmethod
+    def signature(bundle):
+        # mtime and size of each TTL file in the bundle.  Lists (not tuples) so it compares equal after a json trip
+        sig = []
+        try:
+            for entry in sorted(os.scandir(bundle), key=lambda e: e.name):
+                if entry.name.endswith(".ttl") and entry.is_file():
+                    st = entry.stat()
+                    sig.append([entry.name, st.st_mtime_ns, st.st_size])
+        except OSError:
+            return None
+        return sig
+
+    def get(self, bundle, plugin_signature):
+        # plugin_signature(uri) returns the current signature of a plugin, None if unknown
+        entry = self.entries.get(bundle)
+        if entry is None:
+            return None
+        sig = self.signature(bundle)
+        if sig is None or sig != util.DICT_GET(entry, 'signature'):
+            return None
+        plugins = util.DICT_GET(entry, 'plugins') or {}
+        for uri, plugin_sig in plugins.items():
+            if plugin_signature(uri) != plugin_sig:
+                return None
+        return util.DICT_GET(entry, 'pedalboard')
+
+    def put(self, bundle, data, plugins):
+        # plugins is the {uri: signature} of the plugins used
+        sig = self.signature(bundle)
+        if sig is None:
+            return
+        self.entries[bundle] = {'signature': sig, 'plugins': plugins, 'pedalboard': data}
+        self.dirty = True
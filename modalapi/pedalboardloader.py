@@ -0,0 +1,168 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import multiprocessing
+import os
+import requests as req
+import time
+import urllib.parse
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import common.util as util
+import modalapi.bundleloader as BundleLoader
+import modalapi.modclient as ModClient
+
+# effect/get requests are I/O bound, no need to scale these with the number of cores
+MAX_FETCH_WORKERS = 8
+# Start method of the parsing processes.  The pool is created while other threads are running (which may hold
+# locks, eg. BundleLoader's or logging's), so don't fork this process: a child could inherit a held lock and hang
+MP_START_METHOD = "forkserver"
+
+
+def parse_bundle(bundlepath):
+    # Runs in a worker process.  Each process has its own shared lilv World (lilv is not thread safe)
+    try:
+        return BundleLoader.shared_loader().load(bundlepath)
+    except Exception as e:
+        logging.error("Failed to parse pedalboard bundle %s: %s" % (bundlepath, e))
+        return None
+
+
+def parse_bundle_timed(bundlepath):
+    # Also returns the resident memory of the (worker) process doing the parse, before and after, since that's
+    # where the lilv World lives
+    rss_before = util.resident_memory()
+    start = time.monotonic()
+    data = parse_bundle(bundlepath)
+    return data, time.monotonic() - start, os.getpid(), rss_before, util.resident_memory()
+
+
+class PedalboardLoader:
+
+    # Loads a set of pedalboards in 3 stages:
+    #   1. parse all bundles across a pool of worker processes
+    #   2. fetch plugin info (effect/get) for every unique plugin URI not already in plugin_dict, concurrently
+    #   3. create the Plugin/Parameter objects for each pedalboard, in the order given
+    # so the result is the same as loading each pedalboard one after another
+
+    def __init__(self, client, plugin_dict, port_index, workers=None):
+        self.client = client
+        self.plugin_dict = plugin_dict
+        self.port_index = port_index
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.timings = {}  # {bundle: {parse: seconds, populate: seconds}} of the pedalboards loaded
+        self.process_memory = {}  # {pid: [resident bytes before its first parse, most after any parse]}
+        self.parsed = 0
+
+    def parse_bundles(self, bundles):
+        if self.workers <= 1 or len(bundles) <= 1:
+            results = [parse_bundle_timed(b) for b in bundles]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(bundles)),
+                                     mp_context=multiprocessing.get_context(MP_START_METHOD)) as executor:
+                results = list(executor.map(parse_bundle_timed, bundles))
+        datas = []
+        for bundle, (data, seconds, pid, rss_before, rss_after) in zip(bundles, results):
+            self.timings[bundle] = {'parse': seconds}
+            memory = self.process_memory.setdefault(pid, [rss_before, rss_after])
+            memory[1] = max(memory[1], rss_after)
+            if data is not None:
+                self.parsed += 1
+            datas.append(data)
+        return datas
+
+    def parse_memory(self):
+        # (bytes, processes): resident memory gained by the processes which parsed bundles, ie. what the lilv
+        # World(s) and parsing cost
+        return sum(after - before for before, after in self.process_memory.values()), len(self.process_memory)
+
+    def populate(self, pedalboard, data):
+        start = time.monotonic()
+        pedalboard.load_bundle_data(data, self.plugin_dict, self.port_index)
+        self.timings.setdefault(pedalboard.bundle, {})['populate'] = time.monotonic() - start
+
+    def get_plugin_data(self, uri):
+        path = "effect/get?uri=" + urllib.parse.quote(uri)
+        try:
+            resp = self.client.get(path, timeout=ModClient.LONG_TIMEOUT,
+                                   headers={'Cache-Control': 'no-cache', 'Pragma': 'no-cache'})
+        except req.RequestException as e:
+            logging.error("Cannot connect to mod-host: %s" % e)
+            return {}
+
+        if resp.status_code != 200:
+            logging.error("mod-host not able to get plugin data: %s\nStatus: %s" % (path, resp.status_code))
+            return {}
+
+        try:
+            return json.loads(resp.text)
+        except ValueError as e:
+            logging.error("mod-host returned bad plugin data: %s\n%s" % (path, e))
+            return {}
+
+    def fetch_plugin_data(self, uris):
+        missing = [u for u in uris if u not in self.plugin_dict]
+        if len(missing) == 0:
+            return
+        logging.debug("Fetching plugin info for %d plugins" % len(missing))
+        with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(missing))) as executor:
+            for uri, info in zip(missing, executor.map(self.get_plugin_data, missing)):
+                if info:
+                    self.plugin_dict[uri] = info
+
+    @staticmethod
+    def plugin_uris(datas):
+        # Unique plugin URIs in order of first use
+        uris = {}
+        for data in datas:
+            if data is not None:
+                for block in data['blocks']:
+                    if block['plugin_uri'] is not None:
+                        uris[block['plugin_uri']] = None
+        return list(uris)
+
+    def load_one(self, pedalboard):
+        # Load a single pedalboard in this process/thread.  Returns False if it failed
+        data = self.parse_bundles([pedalboard.bundle])[0]
+        if data is None:
+            return False
+        start = time.monotonic()
+        self.fetch_plugin_data(self.plugin_uris([data]))
+        self.timings[pedalboard.bundle]['fetch'] = time.monotonic() - start
+        self.populate(pedalboard, data)
+        return True
+
+    def load(self, pedalboards, lock=None):
+        # Returns the list of pedalboards which loaded successfully.  If given, lock is held while each
+        # pedalboard is populated and pedalboards already loaded (eg. on demand by another thread) are skipped
+        datas = self.parse_bundles([pb.bundle for pb in pedalboards])
+        self.fetch_plugin_data(self.plugin_uris(datas))
+
+        loaded = []
+        for pedalboard, data in zip(pedalboards, datas):
+            if data is None:
+                continue
+            if lock is not None:
+                with lock:
+                    if pedalboard.loaded:
+                        continue
+                    self.populate(pedalboard, data)
+            else:
+                self.populate(pedalboard, data)
+            loaded.append(pedalboard)
+        return loaded
@@ -14,6 +14,9 @@
 # along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
 
 import json
+import common.token as Token
+import common.util as util
+import modalapi.parameter as Parameter
 from pistomp.footswitch import Footswitch
 
 
@@ -52,6 +55,19 @@ class Plugin:
                 if isinstance(c, Footswitch):
                     c.set_value(param.value)
 
+    def to_dict(self):
+        # Only the static (bundle derived) data.  Controllers are bound at runtime
+        return {Token.INSTANCE_ID: self.instance_id, Token.CATEGORY: self.category,
+                Token.PARAMETERS: [p.to_dict() for p in self.parameters.values()]}
+
+    @staticmethod
+    def from_dict(d):
+        parameters = {}
+        for pd in util.DICT_GET(d, Token.PARAMETERS) or []:
+            param = Parameter.Parameter.from_dict(pd)
+            parameters[param.symbol] = param
+        return Plugin(util.DICT_GET(d, Token.INSTANCE_ID), parameters, None, util.DICT_GET(d, Token.CATEGORY))
+
     def to_json(self):
         return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4)
 
@@ -0,0 +1,106 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import os
+
+import common.token as Token
+import common.util as util
+import modalapi.jsoncache as jsoncache
+
+# Bump this whenever the format of the cached plugin data changes so stale caches get discarded
+CACHE_VERSION = 1
+
+
+def control_input_index(info):
+    # {symbol: port_info} for the control input ports of a plugin descriptor.  None if it has no port info
+    try:
+        ports = info[Token.PORTS][Token.CONTROL][Token.INPUT]
+    except (KeyError, TypeError):
+        return None
+    return {util.DICT_GET(pp, Token.SYMBOL): pp for pp in ports}
+
+
+class PluginCache(jsoncache.JsonCache):
+
+    # On-disk cache of the plugin descriptors returned by mod-ui's effect/get, keyed by plugin URI.
+    # Descriptors only change when an LV2 bundle is installed or upgraded, so each entry carries the plugin
+    # version and a signature (mtimes) of the LV2 bundle(s) the plugin came from.  Only entries whose bundles
+    # changed (or disappeared) are invalidated.
+
+    def __init__(self, cache_file):
+        super(PluginCache, self).__init__(cache_file, CACHE_VERSION)
+
+    @staticmethod
+    def signature(info):
+        # mtime of each LV2 bundle directory and its manifest.  None if it can't be determined
+        bundles = util.DICT_GET(info, 'bundles')
+        if not bundles:
+            return None
+        sig = []
+        try:
+            for bundle in sorted(bundles):
+                manifest = os.path.join(bundle, "manifest.ttl")
+                sig.append([bundle, os.stat(bundle).st_mtime_ns, os.stat(manifest).st_mtime_ns])
+        except OSError:
+            return None
+        return sig
+
+    @staticmethod
+    def plugin_version(info):
+        return "%s.%s" % (util.DICT_GET(info, 'minorVersion'), util.DICT_GET(info, 'microVersion'))
+
+    @staticmethod
+    def plugin_signature(info):
+        # Version and bundle signature of a plugin descriptor, as kept by its cache entry.  None if unknown
+        sig = PluginCache.signature(info)
+        if sig is None:
+            return None
+        return [PluginCache.plugin_version(info), sig]
+
+    def cached_signature(self, uri):
+        # plugin_signature of the cached descriptor of uri (only valid ones are kept, see get_all), None if none
+        entry = self.entries.get(uri)
+        if entry is None:
+            return None
+        return [util.DICT_GET(entry, 'version'), util.DICT_GET(entry, 'signature')]
+
+    def get_all(self):
+        # Returns {uri: info} of all still valid entries, invalid ones are dropped
+        valid = {}
+        for uri, entry in list(self.entries.items()):
+            info = util.DICT_GET(entry, 'info')
+            sig = self.signature(info)
+            if sig is None or sig != util.DICT_GET(entry, 'signature'):
+                logging.info("Plugin changed (was version %s): %s" % (util.DICT_GET(entry, 'version'), uri))
+                del self.entries[uri]
+                self.dirty = True
+                continue
+            valid[uri] = info
+        return valid
+
+    def put(self, uri, info):
+        entry = self.entries.get(uri)
+        if entry is not None and util.DICT_GET(entry, 'info') is info:
+            return
+        sig = self.signature(info)
+        if sig is None:
+            return
+        self.entries[uri] = {'signature': sig, 'version': self.plugin_version(info), 'info': info}
+        self.dirty = True
+
+    def update(self, plugin_dict):
+        for uri, info in list(plugin_dict.items()):
+            self.put(uri, info)
@@ -0,0 +1,122 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import heapq
+
+from collections import deque
+
+
+class SignalGraph:
+
+    # Adjacency list of the blocks (plugin instances) of a pedalboard and the arcs (connections) between them.
+    # None is used for the pedalboard itself (system capture/playback ports).
+    #
+    # order() sorts the blocks so each one comes after everything feeding it.  Ties (parallel branches, splits)
+    # are broken by distance from the system inputs, then by the order the blocks were added.  Feedback loops are
+    # broken at their lowest ranked block.  Blocks unreachable from the inputs still get a position, after all
+    # the reachable ones.
+
+    def __init__(self):
+        self.blocks = []      # in the order added
+        self.successors = {}  # block: {block: None, ...} (dicts as insertion ordered sets)
+        self.inputs = {}      # blocks fed directly by the system inputs, likewise
+        self.position = None  # block: index in order(), built on first use
+
+    def add_block(self, block):
+        if block not in self.successors:
+            self.blocks.append(block)
+            self.successors[block] = {}
+            self.position = None
+
+    def add_arc(self, tail, head):
+        # tail/head are the blocks owning the connected ports
+        if head is None or tail == head:
+            return  # connections to system outputs (or a block to itself) don't affect the order
+        self.add_block(head)
+        if tail is None:
+            self.inputs[head] = None
+        else:
+            self.add_block(tail)
+            self.successors[tail][head] = None
+        self.position = None
+
+    def rank(self):
+        # Breadth first distance from the system inputs, and the set of blocks reached.  Unreachable blocks rank
+        # after all reachable ones
+        rank = {}
+        queue = deque(self.inputs)
+        for block in self.inputs:
+            rank[block] = len(rank)
+        while queue:
+            block = queue.popleft()
+            for s in self.successors[block]:
+                if s not in rank:
+                    rank[s] = len(rank)
+                    queue.append(s)
+        reached = set(rank)
+        for block in self.blocks:
+            if block not in rank:
+                rank[block] = len(rank)
+        return rank, reached
+
+    def order(self):
+        # Kahn's topological sort, always picking the ready block with the lowest rank.  Blocks unreachable from
+        # the inputs are held back until all reachable ones are placed, so arcs from them into reachable blocks
+        # are ignored
+        rank, reached = self.rank()
+
+        def counts(tail, head):
+            return tail in reached or head not in reached
+
+        in_degree = dict.fromkeys(self.blocks, 0)
+        for block in self.blocks:
+            for s in self.successors[block]:
+                if counts(block, s):
+                    in_degree[s] += 1
+
+        ready = [(rank[b], b) for b in self.blocks if b in reached and in_degree[b] == 0]
+        heapq.heapify(ready)
+        order = []
+        placed = set()
+        while len(order) < len(self.blocks):
+            if not ready:
+                unplaced = [b for b in self.blocks if b not in placed]
+                pending = [b for b in unplaced if b in reached] or unplaced
+                held = [b for b in pending if in_degree[b] == 0]
+                if len(held) == 0:
+                    # Feedback loop, break it at the lowest ranked block not placed yet
+                    block = min(pending, key=lambda b: rank[b])
+                    in_degree[block] = 0
+                    held = [block]
+                for block in held:
+                    heapq.heappush(ready, (rank[block], block))
+            r, block = heapq.heappop(ready)
+            if block in placed:
+                continue
+            order.append(block)
+            placed.add(block)
+            for s in self.successors[block]:
+                if not counts(block, s):
+                    continue
+                in_degree[s] -= 1
+                if in_degree[s] == 0 and s not in placed:
+                    heapq.heappush(ready, (rank[s], s))
+        return order
+
+    def index(self, block):
+        # Position of block in order(), None if it's not part of the graph
+        if self.position is None:
+            self.position = {b: i for i, b in enumerate(self.order())}
+        return self.position.get(block)
@@ -0,0 +1,152 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+
+import modalapi.networkstatus as NetworkStatus
+
+# Seconds between wifi status refreshes
+WIFI_REFRESH_INTERVAL = 5.0
+# Seconds to give networking to settle after the hotspot is switched, before refreshing the status
+HOTSPOT_SETTLE_TIME = 2.0
+# Written by setup.sh (git describe of the installed software)
+VERSION_FILE = ".version"
+PATCHBOX = "/usr/bin/patchbox"
+COMMAND_TIMEOUT = 30
+
+
+class SystemInfo:
+
+    # Collects system info (wifi status, software version) on a worker thread, so the main thread never waits on
+    # it.  The wifi status is refreshed every WIFI_REFRESH_INTERVAL.  Changes, and the completion of requests like
+    # set_hotspot(), are reported by poll(), which must be called from the main thread (see wakeup)
+
+    def __init__(self, homedir, on_wifi_change=None, interval=WIFI_REFRESH_INTERVAL):
+        self.homedir = homedir
+        self.on_wifi_change = on_wifi_change  # called (by poll) with the new wifi status dict
+        self.interval = interval
+        self.network = NetworkStatus.NetworkStatus()
+        self.wifi_status = {}
+        self.software_version = None
+        self.git_describe = None
+        self.requests = queue.Queue()
+        self.completions = queue.Queue()
+        self.thread = None
+        self.wakeup = None  # if set, called (from the worker thread) when poll() has something to do
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="system-info", daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=None):
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+
+    def run(self):
+        self.load_version()
+        self.refresh_wifi()
+        while True:
+            try:
+                request = self.requests.get(timeout=self.interval)
+            except queue.Empty:
+                self.refresh_wifi()
+                continue
+            if request is None:
+                break
+            func, args, callback = request
+            try:
+                result = func(*args)
+            except Exception as e:
+                logging.error("System info request %s failed: %s" % (func.__name__, e))
+                result = None
+            self._complete(callback, result)
+
+    def _complete(self, callback, result):
+        self.completions.put((callback, result))
+        if self.wakeup is not None:
+            self.wakeup()
+
+    def poll(self):
+        # Call the callbacks of completed requests and of wifi status changes.  Must be called from the main thread
+        while True:
+            try:
+                callback, result = self.completions.get_nowait()
+            except queue.Empty:
+                return
+            if callback is not None:
+                try:
+                    callback(result)
+                except Exception:
+                    logging.exception("System info callback %s failed" % callback.__name__)
+
+    def load_version(self):
+        # The version file is written at install time.  Fall back to asking git (slow) if it's missing
+        describe = None
+        try:
+            with open(os.path.join(self.homedir, VERSION_FILE), 'r') as f:
+                describe = f.read().strip()
+        except OSError:
+            try:
+                output = subprocess.check_output(['git', '--git-dir', self.homedir + '/.git',
+                                                  '--work-tree', self.homedir, 'describe'],
+                                                 timeout=COMMAND_TIMEOUT)
+                describe = output.decode().strip()
+            except (OSError, subprocess.SubprocessError):
+                logging.error("Cannot obtain git software tag info")
+        if describe:
+            self.git_describe = describe
+            self.software_version = describe.split('-')[0]
+
+    def read_wifi_status(self):
+        if self.network.available():
+            return self.network.status()
+        # The interface isn't in sysfs, ask patchbox
+        output = subprocess.check_output([PATCHBOX, 'wifi', 'status'], timeout=COMMAND_TIMEOUT)
+        status = {}
+        for i in output.decode().split('\n'):
+            if '=' not in i:
+                continue
+            (key, value) = i.split('=', 1)
+            if key and value:
+                status[key] = value
+        return status
+
+    def refresh_wifi(self):
+        try:
+            status = self.read_wifi_status()
+        except (OSError, subprocess.SubprocessError) as e:
+            logging.error("Cannot obtain wifi status: %s" % e)
+            return
+        if status != self.wifi_status:
+            self.wifi_status = status
+            self._complete(self.on_wifi_change, dict(status))
+
+    def set_hotspot(self, enable, callback=None):
+        # callback is called (by poll) once the hotspot has been switched and the wifi status refreshed
+        self.requests.put((self._set_hotspot, (enable,), callback))
+
+    def _set_hotspot(self, enable):
+        subprocess.check_output([PATCHBOX, 'wifi', 'hotspot', 'up' if enable else 'down'], timeout=COMMAND_TIMEOUT)
+        time.sleep(HOTSPOT_SETTLE_TIME)
+        self.refresh_wifi()
+        return enable
@@ -19,19 +19,21 @@ import logging
 import os
 import RPi.GPIO as GPIO
 import sys
-import time
 
 from rtmidi.midiutil import open_midioutput
 
+import common.bootprofiler as BootProfiler
 import modalapi.mod as Mod
 import pistomp.audioinjector as Audiocard
 import pistomp.generichost as Generichost
 import pistomp.testhost as Testhost
 import pistomp.hardwarefactory as Hardwarefactory
 import pistomp.handler as Handler
+import pistomp.reactor as Reactor
 
 def main():
     sys.settrace
+    profiler = BootProfiler.BootProfiler()
 
     # Command line parsing
     parser = argparse.ArgumentParser()
@@ -39,6 +41,15 @@ def main():
                         choices=['debug', 'info', 'warning', 'error', 'critical'])
     parser.add_argument("--host", nargs='+', help="Plugin host to use. Example --host mod'", default=['mod'],
                         choices=['mod', 'generic', 'test'])
+    parser.add_argument("--workers", type=int, help="Number of processes used to parse pedalboards. Example --workers 2",
+                        default=None)
+    parser.add_argument("--poll-thread", action='store_true', help="Poll the hardware controls on a dedicated "
+                        "real time thread")
+    parser.add_argument("--poll-cpu", type=int, help="Pin the hardware polling thread to this CPU (one JACK isn't "
+                        "using). Example --poll-cpu 3", default=None)
+    parser.add_argument("--profile-startup", action='store_true', help="Exit once initialized (and pedalboards "
+                        "are loaded), after logging where the startup time went. Report in %s" %
+                        BootProfiler.REPORT_FILE)
 
     args = parser.parse_args()
 
@@ -55,8 +66,9 @@ def main():
     cwd = os.path.dirname(os.path.realpath(__file__))
 
     # Audio Card Config - doing this early so audio passes ASAP
-    audiocard = Audiocard.Audiocard()
-    audiocard.restore()
+    with profiler.phase("audiocard"):
+        audiocard = Audiocard.Audiocard()
+        audiocard.restore()
 
     # MIDI initialization
     # Prompts user for MIDI input port, unless a valid port number or name
@@ -66,10 +78,11 @@ def main():
     # shouldn't need to aconnect, just send msgs directly to the thru port
     port = 0 # TODO get this (the Midi Through port) programmatically
     #port = sys.argv[1] if len(sys.argv) > 1 else None
-    try:
-        midiout, port_name = open_midioutput(port)
-    except (EOFError, KeyboardInterrupt):
-        sys.exit()
+    with profiler.phase("midi"):
+        try:
+            midiout, port_name = open_midioutput(port)
+        except (EOFError, KeyboardInterrupt):
+            sys.exit()
 
     # Hardware and handler objects
     hw = None
@@ -78,34 +91,45 @@ def main():
     if args.host[0] == 'mod':
 
         # Create singleton Mod handler
-        handler = Mod.Mod(audiocard, cwd)
+        with profiler.phase("handler"):
+            handler = Mod.Mod(audiocard, cwd)
+            handler.loader_workers = args.workers
+            handler.profiler = profiler
 
-        # Initialize hardware (Footswitches, Encoders, Analog inputs, etc.)
-        factory = Hardwarefactory.Hardwarefactory()
-        hw = factory.create(handler, midiout)
-        handler.add_hardware(hw)
+        # Initialize hardware (Footswitches, Encoders, Analog inputs, LCD etc.)
+        with profiler.phase("hardware"):
+            factory = Hardwarefactory.Hardwarefactory()
+            hw = factory.create(handler, midiout)
+            handler.add_hardware(hw)
 
         # Load all pedalboard info from the lilv ttl file
-        handler.load_pedalboards()
+        with profiler.phase("load_pedalboards"):
+            handler.load_pedalboards()
 
         # Load the current pedalboard as "current"
-        current_pedal_board_bundle = handler.get_current_pedalboard_bundle_path()
-        if not current_pedal_board_bundle:
-            # Apparently, no pedalboard is currently loaded so just load the first one
-            current_pedal_board_bundle = list(handler.pedalboards.keys())[0]
-        handler.set_current_pedalboard(handler.pedalboards[current_pedal_board_bundle])
+        with profiler.phase("set_current_pedalboard"):
+            current_pedal_board_bundle = handler.get_current_pedalboard_bundle_path()
+            if not current_pedal_board_bundle:
+                # Apparently, no pedalboard is currently loaded so just load the first one
+                current_pedal_board_bundle = list(handler.pedalboards.keys())[0]
+            handler.set_current_pedalboard(handler.pedalboards[current_pedal_board_bundle])
 
         # Load system info.  This can take a few seconds
-        handler.system_info_load()
+        with profiler.phase("system_info_load"):
+            handler.system_info_load()
+
+        if args.poll_thread:
+            hw.start_poller(args.poll_cpu)
 
     elif args.host[0] == 'generic':
         # No specific plugin host specified, so use a generic handler
         # Encoders and LCD not mapped without specific purpose
         # Just initialize the control hardware (footswitches, analog controls, etc.) for use as MIDI controls
         handler = Generichost.Generichost(homedir=cwd)
-        factory = Hardwarefactory.Hardwarefactory()
-        hw = factory.create(handler, midiout)
-        handler.add_hardware(hw)
+        with profiler.phase("hardware"):
+            factory = Hardwarefactory.Hardwarefactory()
+            hw = factory.create(handler, midiout)
+            handler.add_hardware(hw)
 
     elif args.host[0] == 'test':
         handler = Testhost.Testhost(audiocard, homedir=cwd)
@@ -117,18 +141,17 @@ def main():
             handler.cleanup()
             raise
 
-    logging.info("Entering main loop. Press Control-C to exit.")
-    period = 0
+    reactor = Reactor.Reactor()
+    handler.register_event_sources(reactor)
+    profiler.done()
     try:
-        while True:
-            handler.poll_controls()
-            time.sleep(0.01)  # lower to increase responsiveness, but can cause conflict with LCD if too low
-
-            # For less frequent events
-            period += 1
-            if period > 100:
-                handler.poll_modui_changes()
-                period = 0
+        if args.profile_startup:
+            if args.host[0] == 'mod':
+                handler.wait_pedalboards_loaded()
+            profiler.log_summary()
+        else:
+            logging.info("Entering main loop. Press Control-C to exit.")
+            reactor.run()
 
     except KeyboardInterrupt:
         logging.info('keyboard interrupt')
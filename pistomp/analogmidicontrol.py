@@ -65,3 +65,5 @@ class AnalogMidiControl(analogcontrol.AnalogControl):
 
             # save the potentiometer reading for the next loop
             self.last_read = value
+
+        return value_changed
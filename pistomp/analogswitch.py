@@ -76,9 +76,12 @@ class AnalogSwitch(analogcontrol.AnalogControl):
                 if self.longpress_state:
                     self.longpress_state = False
                     self.trigger_count = 0
-                    return
+                    return True
                 else:
                     new_value = Value.RELEASED
             self.trigger_count = 0
 
             self.callback(new_value)
+
+        # Keep sampling at full rate while the switch is held, for long press detection
+        return value_changed or self.trigger_count > 0
@@ -17,6 +17,19 @@ import logging
 import mmap
 import os
 import subprocess
+import threading
+import time
+
+import importlib.util
+alsa_available = importlib.util.find_spec("alsaaudio")
+if alsa_available:
+    import alsaaudio as alsa
+
+# Seconds a mixer setting must stay unchanged before it's stored (alsactl store rewrites the state file)
+STORE_DELAY = 5.0
+
+# Mixer element volume capabilities which mean it's a playback (vs. capture) volume
+PLAYBACK_VOLUME_CAPS = ('Volume', 'Joined Volume', 'Playback Volume', 'Joined Playback Volume')
 
 
 class Audiocard:
@@ -28,6 +41,11 @@ class Audiocard:
         self.initial_config_name = None
         self.CAPTURE_VOLUME = 'Capture'
         self.MASTER = 'Master'
+        self.mixers = {}  # {param_name: (alsaaudio.Mixer, pcmtype, (min dB, max dB)) or None to use amixer}
+        self.store_delay = STORE_DELAY
+        self.store_deadline = None  # time.monotonic() to store at, None if nothing to store
+        self.store_cond = threading.Condition()
+        self.store_thread = None
 
     def restore(self):
         # If the global config_file either doesn't exist, doesn't contain the name of our audiocard, or fails restore,
@@ -58,7 +76,87 @@ class Audiocard:
         except:
             logging.error("Failed trying to store audio card settings to: %s" % self.config_file)
 
+    def schedule_store(self):
+        # Store once the settings have been left alone for store_delay seconds.  Each change just moves the
+        # deadline, which is served by a single long-lived thread
+        with self.store_cond:
+            idle = self.store_deadline is None
+            self.store_deadline = time.monotonic() + self.store_delay
+            if self.store_thread is None:
+                self.store_thread = threading.Thread(target=self.store_loop, name="audiocard-store", daemon=True)
+                self.store_thread.start()
+            elif idle:
+                self.store_cond.notify()
+
+    def store_loop(self):
+        while True:
+            with self.store_cond:
+                while True:
+                    if self.store_deadline is None:
+                        self.store_cond.wait()
+                        continue
+                    remaining = self.store_deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.store_cond.wait(remaining)  # the deadline may have moved meanwhile, so check again
+                self.store_deadline = None
+            self.store()
+
+    def flush_store(self):
+        # Store now if a store is scheduled, eg. on shutdown
+        with self.store_cond:
+            pending = self.store_deadline is not None
+            self.store_deadline = None
+        if pending:
+            self.store()
+
+    def mixer(self, param_name):
+        # Open the mixer element once and keep it, along with its direction and dB range.  None if alsaaudio isn't
+        # available (or is too old to work in dB) or can't open the element, in which case amixer is used
+        if param_name in self.mixers:
+            return self.mixers[param_name]
+        entry = None
+        if alsa_available and hasattr(alsa, 'VOLUME_UNITS_DB'):
+            try:
+                mixer = alsa.Mixer(param_name, cardindex=self.card_index)
+                if any(c in PLAYBACK_VOLUME_CAPS for c in mixer.volumecap()):
+                    pcmtype = alsa.PCM_PLAYBACK
+                else:
+                    pcmtype = alsa.PCM_CAPTURE
+                low, high = mixer.getrange(pcmtype, alsa.VOLUME_UNITS_DB)
+                entry = (mixer, pcmtype, (low / 100.0, high / 100.0))  # alsa dB values are in 1/100 dB
+            except alsa.ALSAAudioError as e:
+                logging.warning("Cannot open mixer %s, using amixer: %s" % (param_name, e))
+        self.mixers[param_name] = entry
+        return entry
+
     def get_parameter(self, param_name):
+        entry = self.mixer(param_name)
+        if entry is not None:
+            mixer, pcmtype = entry[0], entry[1]
+            try:
+                mixer.handleevents()  # pick up changes made elsewhere (eg. alsamixer)
+                return mixer.getvolume(pcmtype, alsa.VOLUME_UNITS_DB)[-1] / 100.0
+            except alsa.ALSAAudioError as e:
+                logging.error("Failed trying to get audio card parameter: %s" % e)
+                self.mixers[param_name] = None
+        return self.get_parameter_amixer(param_name)
+
+    def set_parameter(self, param_name, value):
+        entry = self.mixer(param_name)
+        if entry is not None:
+            mixer, pcmtype, (low, high) = entry
+            value = min(max(value, low), high)
+            try:
+                mixer.setvolume(int(round(value * 100)), pcmtype=pcmtype, units=alsa.VOLUME_UNITS_DB)
+                self.schedule_store()
+                return
+            except alsa.ALSAAudioError as e:
+                logging.error("Failed trying to set audio card parameter: %s" % e)
+                self.mixers[param_name] = None
+        self.set_parameter_amixer(param_name, value)
+
+    def get_parameter_amixer(self, param_name):
         val_str = 0
         cmd = "amixer -c %d -- sget %s" % (self.card_index, param_name)
         try:
@@ -74,12 +172,12 @@ class Audiocard:
         value = float(val_str)
         return value
 
-    def set_parameter(self, param_name, value):
+    def set_parameter_amixer(self, param_name, value):
         cmd = "amixer -c %d -q -- sset %s %ddb" % (self.card_index, param_name, value)
         try:
             subprocess.check_output(cmd, shell=True)
         except subprocess.CalledProcessError:
             logging.error("Failed trying to set audio card parameter")
-        self.store()
+        self.schedule_store()
 
 
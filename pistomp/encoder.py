@@ -51,6 +51,8 @@ class Encoder:
         if d != 0:
             with self._lock:
                 self.direction += d
+            if self.wakeup is not None:
+                self.wakeup()
 
     def __init__(self, d_pin, clk_pin, callback, use_interrupt = True):
 
@@ -58,6 +60,7 @@ class Encoder:
         self.clk_pin = clk_pin
         self.callback = callback
         self.use_interrupt = use_interrupt
+        self.wakeup = None  # if set, called (from the GPIO thread) when a step is detected
 
         GPIO.setup(self.d_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
         GPIO.setup(self.clk_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
@@ -84,6 +87,10 @@ class Encoder:
     def get_clk(self):
         return GPIO.input(self.clk_pin)
 
+    def pending(self):
+        # True if steps detected by the interrupt handler are waiting to be read
+        return self.use_interrupt and self.direction != 0
+
     def read_rotary(self):
         d = 0
         if self.use_interrupt:
@@ -98,3 +105,4 @@ class Encoder:
             d = self._process_gpios()
         if d != 0:
             self.callback(d)
+        return d != 0
@@ -27,3 +27,11 @@ class Generichost(Handler):
     def poll_controls(self):
         if self.hardware:
             self.hardware.poll_controls()
+
+    def register_event_sources(self, reactor):
+        if self.hardware:
+            self.hardware.register_event_sources(reactor)
+
+    def cleanup(self):
+        if self.hardware:
+            self.hardware.cleanup()
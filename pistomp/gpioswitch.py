@@ -28,6 +28,7 @@ class GpioSwitch(controller.Controller):
         self.fs_pin = fs_pin
         self.cur_tstamp = None
         self.events = queue.Queue()
+        self.wakeup = None  # if set, called (from the GPIO thread) when a press is queued
 
         # Long press threshold in seconds
         self.long_press_threshold = 0.5
@@ -48,6 +49,12 @@ class GpioSwitch(controller.Controller):
         # everything from the poller thread
         #
         self.events.put(time.monotonic())
+        if self.wakeup is not None:
+            self.wakeup()
+
+    def pending(self):
+        # True if a press is queued or waiting for release/long press, ie. poll() needs to be called again
+        return self.cur_tstamp is not None or not self.events.empty()
 
     def poll(self):
         # Grab press event if any
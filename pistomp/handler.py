@@ -39,6 +39,11 @@ class Handler:
     def poll_modui_changes(self):
         pass
 
+    def register_event_sources(self, reactor):
+        # Called once, before the main loop (reactor) starts.  By default everything is polled periodically
+        reactor.call_every(0.01, self.poll_controls)
+        reactor.call_every(1.0, self.poll_modui_changes)
+
     def preset_incr_and_change(self):
         pass
 
@@ -21,8 +21,18 @@ import common.token as Token
 import common.util as Util
 import pistomp.analogmidicontrol as AnalogMidiControl
 import pistomp.footswitch as Footswitch
+import pistomp.hardwarepoller as HardwarePoller
+import pistomp.pollscheduler as PollScheduler
 
 from abc import abstractmethod
+from contextlib import nullcontext
+
+# Seconds between samples of the analog controls (ADC), which can't generate events
+ANALOG_POLL_INTERVAL = 0.01
+# Seconds between samples of the analog controls once idle (see PollScheduler)
+ANALOG_IDLE_INTERVAL = 0.1
+# Seconds between polls of the digital controls while they have something pending (eg. a switch waiting for release)
+DIGITAL_POLL_INTERVAL = 0.01
 
 
 class Hardware:
@@ -41,6 +51,7 @@ class Hardware:
         self.version = self.default_cfg[Token.HARDWARE][Token.VERSION]
         self.cfg = None          # compound cfg (default with user/pedalboard specific cfg overlaid)
         self.midi_channel = 0
+        self.idle_timeout = Util.DICT_GET(self.default_cfg[Token.HARDWARE], Token.IDLE_TIMEOUT)
 
         # Standard hardware objects (not required to exist)
         self.relay = None
@@ -51,7 +62,12 @@ class Hardware:
         self.encoder_switches = []
         self.debounce_map = None
         self.joystick = None
-        
+
+        self.reactor = None
+        self.digital_timer = None
+        self.poller = None
+        self.scheduler = None
+
     def init_spi(self):
         self.spi = spidev.SpiDev()
         self.spi.open(0, 1)  # Bus 0, CE1
@@ -65,27 +81,111 @@ class Hardware:
 
     def poll_controls(self):
         # This is intended to be called periodically from main working loop to poll the instantiated controls
+        self.poll_analog_controls()
+        self.poll_digital_controls()
+        if self.joystick:
+            self.joystick.read_joystick()
+
+    def poll_analog_controls(self):
         for c in self.analog_controls:
             c.refresh()
+
+    def poll_polled_encoders(self):
+        # Encoders not using interrupts must be polled continuously.  Returns True if one moved
+        moved = False
+        for e in self.encoders:
+            if not e.use_interrupt and e.read_rotary():
+                moved = True
+        return moved
+
+    def poll_digital_controls(self):
         for e in self.encoders:
             e.read_rotary()
         for s in self.encoder_switches:
             s.poll()
         for s in self.footswitches:
             s.poll()
+
+    def digital_pending(self):
+        return any(c.pending() for c in self.encoders + self.encoder_switches + self.footswitches)
+
+    def start_poller(self, cpu=None):
+        # Poll the controls on a dedicated (real time priority) thread instead of from the reactor
+        self.poller = HardwarePoller.HardwarePoller(self, ANALOG_POLL_INTERVAL, cpu=cpu)
+        self.poller.start()
+
+    def cleanup(self):
+        if self.poller is not None:
+            self.poller.stop(1)
+            self.poller.log_stats()
+        if self.relay is not None:
+            self.relay.wait()
+        if self.scheduler is not None:
+            self.scheduler.log_stats()
+
+    def paused(self):
+        # Context in which the controls can be reconfigured, see HardwarePoller.paused()
+        if self.poller is not None:
+            return self.poller.paused()
+        return nullcontext()
+
+    def defer(self, callback):
+        # Callbacks called from the controls must go through this, see HardwarePoller.deferred()
+        if self.poller is not None:
+            return self.poller.deferred(callback)
+        return callback
+
+    def register_event_sources(self, reactor):
+        # Event driven alternative to calling poll_controls() periodically.  GPIO edge callbacks wake the reactor,
+        # the ADC channels are sampled by the poll scheduler (which the handler can add its own polls to) and the
+        # joystick is read when its input device has events
+        self.reactor = reactor
+        self.scheduler = PollScheduler.PollScheduler(reactor, self.idle_timeout)
         if self.joystick:
-            self.joystick.read_joystick()
-            
+            self.joystick.activity = self.scheduler.activity
+            self.joystick.register_event_sources(reactor)
+        if self.poller is not None:
+            # The polling thread does the polling, the reactor just runs the control callbacks it queues
+            self.poller.notify = reactor.wakeup
+            reactor.on_wakeup(self.poller_dispatch)
+            return
+        for c in self.analog_controls:
+            self.scheduler.add("adc%d" % c.adc_channel, c.refresh, ANALOG_POLL_INTERVAL, ANALOG_IDLE_INTERVAL)
+        for c in self.encoders + self.encoder_switches + self.footswitches:
+            c.wakeup = reactor.wakeup
+        reactor.on_wakeup(self.poll_digital)
+        if any(not e.use_interrupt for e in self.encoders):
+            # Polling slower would lose steps, so these never idle
+            self.scheduler.add("encoders", self.poll_polled_encoders, DIGITAL_POLL_INTERVAL)
+
+    def poller_dispatch(self):
+        if self.poller.dispatch() > 0:
+            self.scheduler.activity()
+
+    def poll_digital(self):
+        # Keep polling (at DIGITAL_POLL_INTERVAL) until nothing is pending, then wait for the next GPIO event
+        if self.digital_pending():
+            self.scheduler.activity()
+        self.poll_digital_controls()
+        if self.digital_timer is None and self.digital_pending():
+            self.digital_timer = self.reactor.call_later(DIGITAL_POLL_INTERVAL, self.poll_digital_timer)
+
+    def poll_digital_timer(self):
+        self.digital_timer = None
+        self.poll_digital()
+
+
     def reinit(self, cfg):
         # reinit hardware as specified by the new cfg context (after pedalboard change, etc.)
-        self.cfg = self.default_cfg.copy()
+        with self.paused():
+            self.cfg = self.default_cfg.copy()
 
-        self.__init_midi_default()
-        self.__init_footswitches(self.cfg)
+            self.__init_midi_default()
+            self.__init_footswitches(self.cfg)
 
-        if cfg is not None:
-            self.__init_midi(cfg)
-            self.__init_footswitches(cfg)
+            if cfg is not None:
+                self.__init_midi(cfg)
+                self.__init_footswitches(cfg)
 
     @abstractmethod
     def init_analog_controls(self):
@@ -250,10 +350,10 @@ class Hardware:
                 if Token.PRESET in f:
                     preset_value = f[Token.PRESET]
                     if preset_value == Token.UP:
-                        fs.add_preset(callback=self.mod.preset_incr_and_change)
+                        fs.add_preset(callback=self.defer(self.mod.preset_incr_and_change))
                         fs.set_display_label("Pre++")
                     if preset_value == Token.DOWN:
-                        fs.add_preset(callback=self.mod.preset_decr_and_change)
+                        fs.add_preset(callback=self.defer(self.mod.preset_decr_and_change))
                         fs.set_display_label("Down")
 
                 # LCD attributes
@@ -0,0 +1,202 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import collections
+import logging
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+# Seconds between polls of the digital controls.  The analog controls are still sampled at their own (slower)
+# interval since their long press detection counts samples
+POLL_INTERVAL = 0.002
+# Control events queued for the main thread.  If it falls this far behind, the oldest events are dropped
+QUEUE_SIZE = 256
+# SCHED_FIFO priority of the polling thread.  Below JACK's (typically 70+) so it never preempts audio
+PRIORITY = 40
+
+
+class HardwarePoller:
+
+    # Polls the hardware controls on a dedicated thread at a fixed rate, so control latency doesn't depend on
+    # what the main thread is doing (drawing the LCD, waiting on mod-ui, etc.).
+    #
+    # MIDI messages and relay switching happen right away on the polling thread.  Control callbacks (which update
+    # the LCD, make mod-ui requests, etc.) are wrapped by deferred(): calling them on the polling thread just
+    # queues the call, and dispatch() runs the queued calls on the main thread.  The queue is a bounded deque
+    # (append and popleft are atomic), so neither side ever waits on the other.
+    #
+    # The controls' configuration (relays, MIDI, preset callbacks, bound parameters) must only be changed from the
+    # main thread within paused(), so the polling thread never sees it half rewritten.
+
+    def __init__(self, hardware, analog_interval, interval=POLL_INTERVAL, cpu=None, priority=PRIORITY,
+                 queue_size=QUEUE_SIZE):
+        self.hardware = hardware
+        self.analog_interval = analog_interval
+        self.interval = interval
+        self.cpu = cpu              # CPU to pin the thread to, None to let the scheduler decide
+        self.priority = priority    # SCHED_FIFO priority, None for normal scheduling
+        self.events = collections.deque(maxlen=queue_size)
+        self.wake = threading.Event()
+        self.lock = threading.RLock()  # held by the polling thread while it polls, see paused()
+        self.read_time = None       # when the input being handled was read (or its GPIO edge seen)
+        self.edge_time = None       # first GPIO edge since the last poll
+        self.notify = None          # if set, called (from the polling thread) when an event is queued
+        self.thread = None
+        self.running = False
+
+        # Stats
+        self.dropped = 0
+        self.polls = 0
+        self.max_lateness = 0       # worst delay of a poll past its scheduled time
+        self.dispatched = 0
+        self.total_latency = 0
+        self.max_latency = 0        # worst delay between reading an input and running its callback on the main thread
+
+    def deferred(self, callback):
+        # Wrap a control callback so that, when called from the polling thread, it runs on the main thread instead
+        if callback is None or getattr(callback, "deferred", False):
+            return callback
+
+        def queue_call(*args):
+            if threading.current_thread() is not self.thread:
+                return callback(*args)  # eg. a joystick footswitch, already on the main thread
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append((self.read_time, callback, args))
+            if self.notify is not None:
+                self.notify()
+        queue_call.deferred = True
+        return queue_call
+
+    def start(self):
+        if self.thread is not None:
+            return
+        hw = self.hardware
+        for e in hw.encoders:
+            e.callback = self.deferred(e.callback)
+        for s in hw.encoder_switches:
+            s.callback = self.deferred(s.callback)
+        for c in hw.analog_controls:
+            if hasattr(c, "callback"):  # AnalogSwitch
+                c.callback = self.deferred(c.callback)
+        for fs in hw.footswitches:
+            fs.refresh_callback = self.deferred(fs.refresh_callback)
+            fs.preset_callback = self.deferred(fs.preset_callback)
+        # GPIO edges poll right away rather than at the next interval
+        for c in hw.encoders + hw.encoder_switches + hw.footswitches:
+            c.wakeup = self.edge
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="hardware-poller", daemon=True)
+        self.thread.start()
+
+    def edge(self):
+        # Called from the GPIO thread
+        if self.edge_time is None:
+            self.edge_time = time.monotonic()
+        self.wake.set()
+
+    @contextmanager
+    def paused(self):
+        # Keep the polling thread out while the controls are reconfigured (eg. on a pedalboard change).  Callbacks
+        # still queued were triggered under the old configuration, so they're dropped rather than run against
+        # the new one.  Must be called from the main thread
+        with self.lock:
+            stale = len(self.events)
+            self.events.clear()
+            self.dropped += stale
+            yield
+
+    def set_realtime(self):
+        # Applies to the calling (polling) thread only
+        if self.cpu is not None:
+            try:
+                os.sched_setaffinity(0, {self.cpu})
+                logging.info("Hardware polling pinned to CPU %d" % self.cpu)
+            except (OSError, ValueError) as e:
+                logging.warning("Cannot pin hardware polling to CPU %d: %s" % (self.cpu, e))
+        if self.priority is not None:
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.priority))
+                logging.info("Hardware polling at SCHED_FIFO priority %d" % self.priority)
+            except (OSError, AttributeError) as e:
+                logging.warning("Cannot set hardware polling priority: %s" % e)
+
+    def run(self):
+        self.set_realtime()
+        now = time.monotonic()
+        next_poll = now
+        next_analog = now
+        while self.running:
+            timeout = next_poll - time.monotonic()
+            woken = self.wake.wait(timeout) if timeout > 0 else False
+            self.wake.clear()
+            if not self.running:
+                break
+            now = time.monotonic()
+            edge_time, self.edge_time = self.edge_time, None
+            try:
+                with self.lock:
+                    # Latency is measured from when the input was read, or from its GPIO edge if earlier
+                    self.read_time = min(edge_time, now) if edge_time is not None else now
+                    self.hardware.poll_digital_controls()
+                    if woken and now < next_poll:
+                        continue  # early poll for a GPIO edge, keep the schedule
+                    self.polls += 1
+                    self.max_lateness = max(self.max_lateness, now - next_poll)
+                    if now >= next_analog:
+                        self.read_time = time.monotonic()
+                        self.hardware.poll_analog_controls()
+                        next_analog += self.analog_interval
+                        if next_analog < now:
+                            next_analog = now + self.analog_interval
+            except Exception as e:
+                logging.error("Hardware poll failed: %s" % e)
+            # Fixed rate.  If we've fallen behind, skip the missed polls rather than bunching them up
+            next_poll += self.interval
+            if next_poll < now:
+                next_poll = now + self.interval
+
+    def dispatch(self):
+        # Run the queued control callbacks, returns how many.  Must be called from the main thread
+        count = 0
+        while True:
+            try:
+                read_time, callback, args = self.events.popleft()
+            except IndexError:
+                return count
+            count += 1
+            latency = time.monotonic() - read_time
+            self.dispatched += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            callback(*args)
+
+    def stop(self, timeout=None):
+        if self.thread is not None:
+            self.running = False
+            self.wake.set()
+            self.thread.join(timeout)
+            self.thread = None
+
+    def log_stats(self):
+        logging.info("Hardware polling: %d polls, worst lateness %.2fms" % (self.polls, self.max_lateness * 1000))
+        if self.dispatched > 0:
+            logging.info("Hardware events: %d, avg latency %.2fms, worst %.2fms, %d dropped" %
+                         (self.dispatched, self.total_latency * 1000 / self.dispatched, self.max_latency * 1000,
+                          self.dropped))
@@ -1,12 +1,28 @@
 from evdev import InputDevice, categorize, ecodes
-from select import select
 import pistomp.encoderswitch as EncoderSwitch
 
 
+# Axis events scroll like the encoder.  The axes rest at 127
+AXES = (ecodes.ABS_X, ecodes.ABS_Y)
+AXIS_CENTER = 127
+
+# Buttons act on release: (type, index) where type is "enc_sw" (index is the switch value) or "fs" (footswitch index)
+BUTTONS = {
+    ecodes.BTN_BASE4: ("enc_sw", EncoderSwitch.Value.RELEASED),     # 297
+    ecodes.BTN_BASE3: ("enc_sw", EncoderSwitch.Value.LONGPRESSED),  # 296
+    ecodes.BTN_TOP2: ("fs", 4),                                     # 292
+    ecodes.BTN_PINKIE: ("fs", 4),                                   # 293
+    ecodes.BTN_TOP: ("fs", 0),                                      # 291
+    ecodes.BTN_THUMB2: ("fs", 1),                                   # 290
+    ecodes.BTN_TRIGGER: ("fs", 2),                                  # 288
+    ecodes.BTN_THUMB: ("fs", 3),                                    # 289
+}
+
+
 class InputDeviceDispatcher:
     def __init__(self, device_fs, cb_enc_top, cb_enc_sw, footswitches):
         try:
-            self.device = InputDevice(device_fs)
+            self.device = InputDevice(device_fs)  # opened non-blocking
         except:
             self.device = None
             pass
@@ -14,44 +30,63 @@ class InputDeviceDispatcher:
         self.footswitches = footswitches
         self.cb_enc_top = cb_enc_top
         self.cb_enc_sw = cb_enc_sw
+        self.reactor = None
+        self.activity = None  # if set, called when an event is handled
         print("Initializing joystick", self.device)
         print("Footswitches", self.footswitches)
-        
-    def read_joystick(self):
+
+        # (event type, event code): handler(value)
+        self.dispatch = {}
+        for code in AXES:
+            self.dispatch[(ecodes.EV_ABS, code)] = self._axis
+        for code, (kind, arg) in BUTTONS.items():
+            if kind == "enc_sw":
+                self.dispatch[(ecodes.EV_KEY, code)] = lambda value, arg=arg: self._enc_sw(value, arg)
+            else:
+                self.dispatch[(ecodes.EV_KEY, code)] = lambda value, arg=arg: self._footswitch(value, arg)
+
+    def register_event_sources(self, reactor):
+        # Have the reactor call read_joystick whenever the device has input
         if self.device:
-            try:
-                r,w,x = select([self.device], [], [])
+            self.reactor = reactor
+            reactor.add_reader(self.device, self.read_joystick)
+
+    def _axis(self, value):
+        if value < AXIS_CENTER:
+            self.cb_enc_top(-1)
+        elif value > AXIS_CENTER:
+            self.cb_enc_top(1)
+
+    def _enc_sw(self, value, switch_value):
+        if value == 0:
+            self.cb_enc_sw(switch_value)
+
+    def _footswitch(self, value, index):
+        if value == 0 and index < len(self.footswitches):
+            self.footswitches[index].pressed(True)
+
+    def read_joystick(self):
+        # Handle all pending events.  Never blocks, returns once there are none left
+        if not self.device:
+            return
+        try:
+            while True:
                 for event in self.device.read():
                     # print(categorize(event), "E", event.code, event.type, event.value)
-
-                    if event.code == 0 and event.type == 3 and event.value < 127:
-                        self.cb_enc_top(-1)
-                    elif event.code == 0 and event.type == 3 and event.value > 127:
-                        self.cb_enc_top(1)
-                    if event.code == 1 and event.type == 3 and event.value < 127:
-                        self.cb_enc_top(-1)
-                    elif event.code == 1 and event.type == 3 and event.value > 127:
-                        self.cb_enc_top(1)
-                        
-                    elif event.code == 297 and event.type == 1 and event.value == 0:
-                        self.cb_enc_sw(EncoderSwitch.Value.RELEASED)
-                    elif event.code == 296 and event.type == 1 and event.value == 0:
-                        self.cb_enc_sw(EncoderSwitch.Value.LONGPRESSED)
-                        
-                    elif event.code == 292 and event.type == 1 and event.value == 0:
-                        self.footswitches[4].pressed(True)
-                    elif event.code == 293 and event.type == 1 and event.value == 0:
-                        self.footswitches[4].pressed(True)
-                        
-                    elif event.code == 291 and event.type == 1 and event.value == 0:
-                        self.footswitches[0].pressed(True)
-                    elif event.code == 290 and event.type == 1 and event.value == 0:
-                        self.footswitches[1].pressed(True)
-                    elif event.code == 288 and event.type == 1 and event.value == 0:
-                        self.footswitches[2].pressed(True)
-                    elif event.code == 289 and event.type == 1 and event.value == 0:
-                        self.footswitches[3].pressed(True)                                            
-                    
-            except Exception as e:
-                print("Error in joystick capture", str(e))
-                pass
+                    handler = self.dispatch.get((event.type, event.code))
+                    if handler is not None:
+                        handler(event.value)
+                        if self.activity is not None:
+                            self.activity()
+        except BlockingIOError:
+            pass  # no more events
+        except OSError as e:
+            # Device gone (eg. unplugged), stop reading it
+            print("Joystick lost", str(e))
+            if self.reactor is not None:
+                self.reactor.remove_reader(self.device)
+            self.device.close()
+            self.device = None
+        except Exception as e:
+            print("Error in joystick capture", str(e))
+            pass
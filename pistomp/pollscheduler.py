@@ -0,0 +1,143 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import time
+
+# Seconds without any input before polling drops to the idle rates
+IDLE_TIMEOUT = 30.0
+
+
+class Source:
+
+    def __init__(self, name, callback, interval, idle_interval):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.idle_interval = idle_interval if idle_interval is not None else interval
+        self.timer = None
+
+        # Stats
+        self.calls = 0
+        self.total_time = 0
+        self.max_time = 0
+
+
+class PollScheduler:
+
+    # Runs periodic polls (ADC channels, LCD updates, the MOD UI check, ...) on the reactor, each at its own rate.
+    # After idle_timeout seconds with no input, each source drops to its idle rate.  activity() (a GPIO edge, a
+    # joystick event) or a poll callback returning True (eg. an ADC change beyond its threshold) switches
+    # everything back to the full rate immediately.
+
+    def __init__(self, reactor, idle_timeout=None):
+        self.reactor = reactor
+        self.idle_timeout = idle_timeout if idle_timeout is not None else IDLE_TIMEOUT
+        self.sources = {}
+        self.idle = False
+        self.last_activity = time.monotonic()
+        self.started = self.last_activity
+
+        # Stats
+        self.idle_periods = 0
+        self.idle_time = 0
+        self.idle_since = None
+
+    def add(self, name, callback, interval, idle_interval=None):
+        # callback is called every interval seconds (idle_interval when idle, None to never slow down).  It returns
+        # True if it saw input
+        source = Source(name, callback, interval, idle_interval)
+        self.sources[name] = source
+        self._schedule(source)
+        return source
+
+    def remove(self, name):
+        source = self.sources.pop(name, None)
+        if source is not None and source.timer is not None:
+            source.timer.cancel()
+
+    def _schedule(self, source):
+        if source.timer is not None:
+            source.timer.cancel()
+        interval = source.idle_interval if self.idle else source.interval
+        source.timer = self.reactor.call_later(interval, lambda: self._run(source))
+
+    def _run(self, source):
+        source.timer = None
+        start = time.monotonic()
+        active = source.callback()
+        now = time.monotonic()
+        source.calls += 1
+        source.total_time += now - start
+        source.max_time = max(source.max_time, now - start)
+
+        if active:
+            self.activity()
+        elif not self.idle and now - self.last_activity > self.idle_timeout:
+            self._set_idle(now)
+        if source.timer is None and source.name in self.sources:
+            self._schedule(source)
+
+    def _set_idle(self, now):
+        logging.debug("Polling idle")
+        self.idle = True
+        self.idle_since = now
+        self.idle_periods += 1
+
+    def activity(self):
+        # Input seen.  Must be called from the reactor thread
+        now = time.monotonic()
+        self.last_activity = now
+        if self.idle:
+            logging.debug("Polling active")
+            self.idle = False
+            self.idle_time += now - self.idle_since
+            self.idle_since = None
+            # Don't wait out the (long) idle intervals
+            for source in self.sources.values():
+                if source.idle_interval != source.interval:
+                    self._schedule(source)
+
+    def stats(self):
+        # Snapshot of the scheduler state and each source's rate and cost
+        now = time.monotonic()
+        elapsed = now - self.started
+        idle_time = self.idle_time + (now - self.idle_since if self.idle else 0)
+        sources = {}
+        for s in self.sources.values():
+            sources[s.name] = {
+                "interval": s.interval,
+                "idle_interval": s.idle_interval,
+                "calls": s.calls,
+                "rate": s.calls / elapsed if elapsed > 0 else 0,
+                "avg_ms": s.total_time * 1000 / s.calls if s.calls > 0 else 0,
+                "max_ms": s.max_time * 1000,
+                "load": s.total_time / elapsed if elapsed > 0 else 0
+            }
+        return {
+            "idle": self.idle,
+            "idle_periods": self.idle_periods,
+            "idle_fraction": idle_time / elapsed if elapsed > 0 else 0,
+            "sources": sources
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info("Polling: idle %.0f%% of the time (%d idle periods)" %
+                     (stats["idle_fraction"] * 100, stats["idle_periods"]))
+        for name, s in stats["sources"].items():
+            logging.info("  %s: %.1f/s (budget %.1f/s, idle %.1f/s), avg %.3fms, max %.3fms, load %.2f%%" %
+                         (name, s["rate"], 1 / s["interval"], 1 / s["idle_interval"], s["avg_ms"], s["max_ms"],
+                          s["load"] * 100))
@@ -0,0 +1,128 @@
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+import heapq
+import itertools
+import os
+import selectors
+import time
+
+
+class Timer:
+
+    def __init__(self, callback, deadline, interval=None):
+        self.callback = callback
+        self.deadline = deadline
+        self.interval = interval  # None for a one shot timer
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Reactor:
+
+    # Event loop for the main thread.  Sleeps in select() until one of:
+    #   - a registered file descriptor is readable (eg. the joystick input device)
+    #   - a timer is due (eg. sampling the ADC, checking for MOD UI changes)
+    #   - wakeup() is called from another thread (eg. a GPIO edge callback, a completed mod-ui request), after
+    #     which all the on_wakeup() callbacks are run
+    # All callbacks run on the thread calling run(), one at a time.
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.timers = []  # heap of (deadline, sequence, Timer)
+        self.sequence = itertools.count()
+        self.wakeup_callbacks = []
+        self.running = False
+
+        # Self pipe, so other threads can interrupt select()
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        os.set_blocking(self.wakeup_write, False)
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ, self._wakeup_ready)
+
+    def add_reader(self, fileobj, callback):
+        self.selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fileobj):
+        self.selector.unregister(fileobj)
+
+    def on_wakeup(self, callback):
+        self.wakeup_callbacks.append(callback)
+
+    def call_later(self, delay, callback):
+        return self._schedule(Timer(callback, time.monotonic() + delay))
+
+    def call_every(self, interval, callback):
+        return self._schedule(Timer(callback, time.monotonic() + interval, interval))
+
+    def _schedule(self, timer):
+        heapq.heappush(self.timers, (timer.deadline, next(self.sequence), timer))
+        return timer
+
+    def wakeup(self):
+        # Safe to call from any thread
+        try:
+            os.write(self.wakeup_write, b"\0")
+        except BlockingIOError:
+            pass  # Pipe full, a wakeup is pending anyway
+
+    def _wakeup_ready(self):
+        try:
+            while os.read(self.wakeup_read, 512):
+                pass
+        except BlockingIOError:
+            pass
+        for callback in self.wakeup_callbacks:
+            callback()
+
+    def run_once(self):
+        timeout = None
+        while self.timers and self.timers[0][2].cancelled:
+            heapq.heappop(self.timers)
+        if self.timers:
+            timeout = max(0, self.timers[0][0] - time.monotonic())
+
+        for key, mask in self.selector.select(timeout):
+            key.data()
+
+        # Run due timers.  Periodic timers are rescheduled from their deadline so they don't drift, unless they've
+        # fallen behind, in which case the missed runs are skipped
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            deadline, seq, timer = heapq.heappop(self.timers)
+            if timer.cancelled:
+                continue
+            if timer.interval is not None:
+                timer.deadline = deadline + timer.interval
+                if timer.deadline < now:
+                    timer.deadline = now + timer.interval
+                self._schedule(timer)
+            timer.callback()
+
+    def run(self):
+        self.running = True
+        while self.running:
+            self.run_once()
+
+    def stop(self):
+        self.running = False
+        self.wakeup()
+
+    def close(self):
+        self.selector.close()
+        os.close(self.wakeup_read)
+        os.close(self.wakeup_write)
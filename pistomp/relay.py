@@ -18,11 +18,19 @@ import os
 from pathlib import Path
 import RPi.GPIO as GPIO
 import shutil
+import threading
 import time
 
+# Seconds the coil of the latching relay is driven to switch it
+PULSE_TIME = 0.04
+
 
 class Relay:
 
+    # Switching doesn't block the caller (often the thread polling the controls): the coil is released at the end
+    # of the pulse and the bypass sentinel file is written by a single long-lived worker thread (started on the
+    # first switch), so no thread is created per switch.  Use wait() before GPIO.cleanup() to let those finish.
+
     def __init__(self, set_pin, reset_pin):
         self.enabled = False
         self.set_pin = set_pin
@@ -32,10 +40,20 @@ class Relay:
         # Non-existence indicates the pi-stomp should process audio
         self.sentinel_file = os.path.join(os.path.expanduser("~"), ".relay_bypass%d" % set_pin)
 
-        GPIO.setup(reset_pin, GPIO.OUT)
-        GPIO.output(reset_pin, GPIO.LOW)
-        GPIO.setup(set_pin, GPIO.OUT)
-        GPIO.output(set_pin, GPIO.LOW)
+        self.cond = threading.Condition()
+        self.pulse_pin = None
+        self.release_at = None        # time.monotonic() to release pulse_pin at
+        self.sentinel_dirty = False   # the sentinel file needs updating
+        self.writing = False          # the sentinel file is being updated
+        self.worker = None
+
+        self.setup_pins()
+
+    def setup_pins(self):
+        GPIO.setup(self.reset_pin, GPIO.OUT)
+        GPIO.output(self.reset_pin, GPIO.LOW)
+        GPIO.setup(self.set_pin, GPIO.OUT)
+        GPIO.output(self.set_pin, GPIO.LOW)
 
     def init_state(self):
         bypass = os.path.isfile(self.sentinel_file)
@@ -46,23 +64,80 @@ class Relay:
         return not bypass
 
     def enable(self):
-        GPIO.output(self.set_pin, GPIO.HIGH)
-        time.sleep(0.04)
-        self.enabled = True
-        GPIO.output(self.set_pin, GPIO.LOW)
-        logging.debug("Relay on: %d" % self.set_pin)
-
-        if os.path.isfile(self.sentinel_file):
-            os.remove(self.sentinel_file)
+        self.set_state(True)
 
     def disable(self):
-        GPIO.output(self.reset_pin, GPIO.HIGH)
-        time.sleep(0.04)
-        self.enabled = False
-        GPIO.output(self.reset_pin, GPIO.LOW)
-        logging.debug("Relay off: %d" % self.reset_pin)
+        self.set_state(False)
+
+    def set_state(self, enabled):
+        self.drive(enabled)
+        self.enabled = enabled
+        logging.debug("Relay %s: %d" % ("on" if enabled else "off", self.set_pin))
+        self.persist()
+
+    def drive(self, enabled):
+        # Latching relay: pulse the set or reset coil
+        self.pulse(self.set_pin if enabled else self.reset_pin)
+
+    def pulse(self, pin):
+        with self.cond:
+            self._release()  # never drive both coils, cut short a pulse still in progress
+            GPIO.output(pin, GPIO.HIGH)
+            self.pulse_pin = pin
+            self.release_at = time.monotonic() + PULSE_TIME
+            self._wake()
+
+    def _release(self):
+        # Called with cond held
+        self.release_at = None
+        if self.pulse_pin is not None:
+            GPIO.output(self.pulse_pin, GPIO.LOW)
+            self.pulse_pin = None
+
+    def persist(self):
+        with self.cond:
+            self.sentinel_dirty = True
+            self._wake()
+
+    def _wake(self):
+        # Called with cond held
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._run, name="relay%d" % self.set_pin, daemon=True)
+            self.worker.start()
+        else:
+            self.cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while True:
+                    if self.release_at is not None and time.monotonic() >= self.release_at:
+                        self._release()
+                    if self.sentinel_dirty:
+                        self.sentinel_dirty = False
+                        self.writing = True
+                        break
+                    self.cond.notify_all()  # idle (or just pulsing), see wait()
+                    self.cond.wait(self.release_at - time.monotonic() if self.release_at is not None else None)
+            self._write_sentinel()
+            with self.cond:
+                self.writing = False
 
-        f = Path(self.sentinel_file)
-        f.touch()
-        shutil.chown(f, user="patch", group=None)
+    def _write_sentinel(self):
+        # Writes whatever the state is by the time it runs, so the last write always matches the last change
+        try:
+            if self.enabled:
+                if os.path.isfile(self.sentinel_file):
+                    os.remove(self.sentinel_file)
+            else:
+                f = Path(self.sentinel_file)
+                f.touch()
+                shutil.chown(f, user="patch", group=None)
+        except (OSError, LookupError) as e:
+            logging.error("Failed to update relay sentinel %s: %s" % (self.sentinel_file, e))
 
+    def wait(self):
+        # Wait for the pulse and sentinel write in progress, if any
+        with self.cond:
+            while self.release_at is not None or self.sentinel_dirty or self.writing:
+                self.cond.wait()
@@ -13,7 +13,6 @@
 # You should have received a copy of the GNU General Public License
 # along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
 
-import logging
 import RPi.GPIO as GPIO
 
 import pistomp.relay as relay
@@ -21,18 +20,11 @@ import pistomp.relay as relay
 
 class Relay(relay.Relay):
 
-    def __init__(self, set_pin, reset_pin):
-        self.enabled = False
-        self.set_pin = set_pin
-        GPIO.setup(set_pin, GPIO.OUT)
-        GPIO.output(set_pin, GPIO.LOW)
+    # Same interface as the latching relay, the coil is simply held while enabled
 
-    def enable(self):
-        self.enabled = True
-        GPIO.output(self.set_pin, self.enabled)
-        logging.debug("Relay on: %d" % self.set_pin)
+    def setup_pins(self):
+        GPIO.setup(self.set_pin, GPIO.OUT)
+        GPIO.output(self.set_pin, GPIO.LOW)
 
-    def disable(self):
-        self.enabled = False
-        GPIO.output(self.set_pin, self.enabled)
-        logging.debug("Relay off: %d" % self.set_pin)
+    def drive(self, enabled):
+        GPIO.output(self.set_pin, enabled)
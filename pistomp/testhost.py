@@ -163,6 +163,8 @@ class Testhost(Handler):
     def cleanup(self):
         if self.stdscr is not None:
             self._cleanup_curses()
+        if self.audiocard is not None:
+            self.audiocard.flush_store()
 
     def __del__(self):
         self.cleanup()
@@ -97,5 +97,8 @@ setup/services/create_services.sh
 setup/services/tweak_services.sh
 setup/services/stop_services.sh
 
+printf "\n===== Record software version =====\n"
+git describe > .version || rm -f .version
+
 printf "\n===== pi-stomp setup complete =====\n"
 
@@ -32,6 +32,12 @@ sudo /usr/bin/pip3 install python-rtmidi
 # Requests
 sudo /usr/bin/pip3 install requests
 
+# MOD UI event subscription (websocket)
+sudo /usr/bin/pip3 install websocket-client
+
+# MOD UI requests over its unix socket
+sudo /usr/bin/pip3 install requests-unixsocket
+
 # GPIO
 sudo /usr/bin/pip3 install RPi.GPIO
 
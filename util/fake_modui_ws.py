@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+# Fake MOD UI websocket server for testing the mod-ui event subscriber without a running mod-ui.
+# Each line typed on stdin is sent, as is, to all connected clients, eg:
+#   param_set /graph/gxtuner :bypass 1.0
+#   pedal_snapshot 1 Lead
+#   loading_end 0
+# Messages received from clients (pong, data_ready acks) are printed.
+#
+# Usage: fake_modui_ws.py [port]   then point ModWebSocket at ws://localhost:<port>/websocket
+
+import base64
+import hashlib
+import socket
+import struct
+import sys
+import threading
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+clients = []
+clients_lock = threading.Lock()
+
+
+def send_frame(conn, text):
+    # Server to client frames are not masked
+    payload = text.encode("utf-8")
+    header = bytes([0x81])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    elif len(payload) < 65536:
+        header += bytes([126]) + struct.pack(">H", len(payload))
+    else:
+        header += bytes([127]) + struct.pack(">Q", len(payload))
+    conn.sendall(header + payload)
+
+
+def recv_exact(conn, n):
+    data = b""
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return data
+
+
+def recv_frame(conn):
+    # Returns (opcode, payload).  Client to server frames are always masked
+    b1, b2 = recv_exact(conn, 2)
+    length = b2 & 0x7f
+    if length == 126:
+        length = struct.unpack(">H", recv_exact(conn, 2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", recv_exact(conn, 8))[0]
+    mask = recv_exact(conn, 4) if b2 & 0x80 else None
+    payload = recv_exact(conn, length)
+    if mask is not None:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return b1 & 0x0f, payload
+
+
+def handshake(conn):
+    request = b""
+    while b"\r\n\r\n" not in request:
+        chunk = conn.recv(1024)
+        if not chunk:
+            raise ConnectionError("closed during handshake")
+        request += chunk
+    key = None
+    for line in request.decode("latin-1").split("\r\n"):
+        if line.lower().startswith("sec-websocket-key:"):
+            key = line.split(":", 1)[1].strip()
+    if key is None:
+        raise ConnectionError("not a websocket request")
+    accept = base64.b64encode(hashlib.sha1((key + GUID).encode()).digest()).decode()
+    conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  "Sec-WebSocket-Accept: %s\r\n\r\n" % accept).encode())
+
+
+def serve_client(conn, addr):
+    try:
+        handshake(conn)
+        print("client connected: %s:%d" % addr)
+        # Like mod-ui, start with the current state
+        send_frame(conn, "loading_start 1 0")
+        send_frame(conn, "loading_end 0")
+        with clients_lock:
+            clients.append(conn)
+        while True:
+            opcode, payload = recv_frame(conn)
+            if opcode == 0x8:  # close
+                break
+            elif opcode == 0x9:  # ping
+                conn.sendall(bytes([0x8a, len(payload)]) + payload)
+            elif opcode == 0x1:
+                print("received: %s" % payload.decode("utf-8", "replace"))
+    except (ConnectionError, OSError) as e:
+        print("client %s:%d: %s" % (addr[0], addr[1], e))
+    finally:
+        with clients_lock:
+            if conn in clients:
+                clients.remove(conn)
+        conn.close()
+        print("client disconnected: %s:%d" % addr)
+
+
+def accept_loop(server):
+    while True:
+        conn, addr = server.accept()
+        threading.Thread(target=serve_client, args=(conn, addr), daemon=True).start()
+
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8888
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("localhost", port))
+    server.listen()
+    threading.Thread(target=accept_loop, args=(server,), daemon=True).start()
+    print("listening on ws://localhost:%d/websocket" % port)
+
+    try:
+        for line in sys.stdin:
+            msg = line.strip()
+            if not msg:
+                continue
+            with clients_lock:
+                for conn in list(clients):
+                    try:
+                        send_frame(conn, msg)
+                    except OSError:
+                        pass
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
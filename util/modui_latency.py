@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+# Measures mod-ui request latency over TCP and over mod-ui's unix socket (if available), eg.
+#   modui_latency.py -n 500 pedalboard/current
+#   modui_latency.py -n 200 effect/parameter/pi_stomp_get//graph/gxtuner/:bypass
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import modalapi.modclient as ModClient
+
+
+def measure(client, path, count):
+    client.get(path)  # warm up (connect)
+    times = []
+    for i in range(count):
+        start = time.monotonic()
+        client.get(path)
+        times.append(time.monotonic() - start)
+    return sorted(times)
+
+
+def report(name, times):
+    ms = [t * 1000 for t in times]
+    print("%-6s n=%d  avg %.3fms  p50 %.3fms  p95 %.3fms  max %.3fms" %
+          (name, len(ms), sum(ms) / len(ms), ms[len(ms) // 2], ms[int(len(ms) * 0.95)], ms[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=200, help="number of requests per transport")
+    parser.add_argument("--uri", default="http://localhost:80/", help="mod-ui TCP root uri")
+    parser.add_argument("--socket", default=ModClient.UNIX_SOCKET, help="mod-ui unix socket")
+    parser.add_argument("path", nargs='?', default="pedalboard/current", help="request path")
+    args = parser.parse_args()
+
+    tcp = ModClient.ModClient(args.uri, unix_socket=None)
+    report("tcp", measure(tcp, args.path, args.n))
+
+    unix = ModClient.ModClient(args.uri, unix_socket=args.socket)
+    if not unix.using_unix_socket():
+        print("unix socket not available (%s missing or requests-unixsocket not installed)" % args.socket)
+        return
+    report("unix", measure(unix, args.path, args.n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+# Prints the wifi status as read by modalapi/networkstatus.py, eg. to compare with "patchbox wifi status".
+# With --fake, builds a fake sysfs/hostapd tree for each state and checks the status read from it, eg.
+#   network_status.py
+#   network_status.py --interface wlan1
+#   network_status.py --fake
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import modalapi.networkstatus as NetworkStatus
+
+# (operstate, hostapd running, expected status)
+FAKE_STATES = [
+    (None, False, {'hotspot_active': "0", 'wifi_connected': "0"}),
+    ("down", False, {'hotspot_active': "0", 'wifi_connected': "0"}),
+    ("dormant", False, {'hotspot_active': "0", 'wifi_connected': "0"}),
+    ("up", False, {'hotspot_active': "0", 'wifi_connected': "1", 'ip_address': "192.168.1.20"}),
+    ("up", True, {'hotspot_active': "1", 'wifi_connected': "0", 'ip_address': "192.168.1.20"}),
+    ("down", True, {'hotspot_active': "0", 'wifi_connected': "0"}),
+]
+
+
+def check_fake(interface):
+    failed = 0
+    for operstate, hostapd, expected in FAKE_STATES:
+        with tempfile.TemporaryDirectory() as root:
+            sysfs = os.path.join(root, "sys", "class", "net")
+            hostapd_dir = os.path.join(root, "run", "hostapd")
+            os.makedirs(hostapd_dir)
+            if operstate is not None:
+                os.makedirs(os.path.join(sysfs, interface))
+                with open(os.path.join(sysfs, interface, "operstate"), 'w') as f:
+                    f.write(operstate + "\n")
+            else:
+                os.makedirs(sysfs)
+            if hostapd:
+                open(os.path.join(hostapd_dir, interface), 'w').close()
+            network = NetworkStatus.NetworkStatus(interface, sysfs, hostapd_dir,
+                                                  get_address=lambda i: "192.168.1.20")
+            status = network.status()
+            available = network.available()
+        ok = status == expected and available == (operstate is not None)
+        failed += 0 if ok else 1
+        print("%-4s operstate=%s hostapd=%s available=%s: %s" % ("ok" if ok else "FAIL", operstate, hostapd,
+                                                                 available, status))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interface", default=NetworkStatus.INTERFACE, help="wifi interface")
+    parser.add_argument("--fake", action='store_true', help="check against fake sysfs trees")
+    args = parser.parse_args()
+
+    if args.fake:
+        sys.exit(1 if check_fake(args.interface) else 0)
+
+    for key, value in NetworkStatus.NetworkStatus(args.interface).status().items():
+        print("%s=%s" % (key, value))
+
+
+if __name__ == '__main__':
+    main()
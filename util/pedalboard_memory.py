@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# This file is part of pi-stomp.
+#
+# pi-stomp is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pi-stomp is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pi-stomp.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compares the memory cost of parsing pedalboard bundles the old way (a lilv World per pedalboard, kept for the
+# life of the process) with the shared BundleLoader (one World, each bundle unloaded once extracted), eg.
+#   pedalboard_memory.py ~/data/.pedalboards/*.pedalboard
+# Each approach runs in a fresh process so they don't affect each other.
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import common.util as util
+
+
+def parse_separate_worlds(bundles):
+    # What Pedalboard did before modalapi/bundleloader.py
+    import lilv
+    worlds = []
+    for bundlepath in bundles:
+        bundle = os.path.abspath(bundlepath)
+        if not bundle.endswith(os.sep):
+            bundle += os.sep
+        world = lilv.World()
+        world.load_specifications()
+        world.load_plugin_classes()
+        world.load_bundle(world.new_file_uri(None, bundle))
+        worlds.append(world)
+    return worlds
+
+
+def parse_shared_world(bundles):
+    import modalapi.bundleloader as BundleLoader
+    datas = []
+    for bundlepath in bundles:
+        try:
+            datas.append(BundleLoader.shared_loader().load(bundlepath))
+        except Exception as e:
+            print("Failed to parse %s: %s" % (bundlepath, e))
+    return datas
+
+
+def measure(name, bundles, queue):
+    before = util.resident_memory()
+    kept = globals()[name](bundles)
+    queue.put(util.resident_memory() - before)
+    del kept
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("bundles", nargs='+', help="pedalboard bundle directories")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for name in ("parse_separate_worlds", "parse_shared_world"):
+        queue = ctx.Queue()
+        p = ctx.Process(target=measure, args=(name, args.bundles, queue))
+        p.start()
+        p.join()
+        if p.exitcode != 0:
+            print("%s failed" % name)
+            sys.exit(1)
+        results[name] = queue.get()
+
+    count = len(args.bundles)
+    for name, label in (("parse_separate_worlds", "before (World per pedalboard)"),
+                        ("parse_shared_world", "after (shared World)")):
+        used = results[name]
+        print("%-32s %8d KB total, %6d KB per pedalboard" % (label, used / 1024, used / 1024 / count))
+
+
+if __name__ == '__main__':
+    main()
@@ -42,6 +42,7 @@ def main():
     else:
         print("enabling...")
         relay.enable()
+    relay.wait()
 
     if mode_previously_unset is True:
         print ("cleanup GPIO")